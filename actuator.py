@@ -0,0 +1,292 @@
+import time
+import heapq
+import itertools
+import threading
+import queue
+import config
+
+class ServoWriter:
+    """
+    專屬的伺服馬達寫入執行緒 (PCA9685 / I2C)
+    - 呼叫端只更新目標角度 (latest-wins)，不會卡在 I2C 上
+    - 變化量小於馬達解析度的寫入直接略過
+    - 限制 I2C 寫入頻率，期間內的多次指令合併成一次
+    """
+    def __init__(self, kit, resolution=config.SERVO_RESOLUTION, max_rate=config.SERVO_MAX_RATE):
+        self.kit = kit
+        self.resolution = resolution
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.cond = threading.Condition()
+        self.targets = {} # channel -> 尚未寫入的最新角度
+        self.written = {} # channel -> 最後實際寫入的角度
+        self.last_write = 0.0
+        self.busy = False # 正在寫入 I2C
+        self.running = True
+        self.counters = {"requested": 0, "written": 0, "skipped": 0, "coalesced": 0}
+        self.thread = threading.Thread(target=self._loop, name="servo-writer", daemon=True)
+        self.thread.start()
+
+    def set(self, channel, angle, force=False):
+        self.set_many({channel: angle}, force)
+
+    def set_many(self, angles, force=False):
+        """更新目標角度 (非阻塞)；force 用於扳機等必須寫入的通道"""
+        with self.cond:
+            for channel, angle in angles.items():
+                self.counters["requested"] += 1
+                if channel in self.targets:
+                    self.counters["coalesced"] += 1
+                if force:
+                    self.written.pop(channel, None)
+                self.targets[channel] = angle
+            self.cond.notify()
+
+    def angle(self, channel):
+        """目前的目標角度 (尚未寫入則為最後寫入的角度)"""
+        with self.cond:
+            return self.targets.get(channel, self.written.get(channel))
+
+    def flush(self, timeout=1.0):
+        """等待所有待寫入的角度送出"""
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.targets and not self.busy, timeout)
+
+    def stats(self):
+        with self.cond:
+            return dict(self.counters)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout=1.0)
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.targets or not self.running)
+                if not self.running: return
+                # 頻率限制：還沒到下一次可寫入的時間就繼續等，期間的新指令直接覆蓋
+                remaining = self.last_write + self.interval - time.monotonic()
+                if remaining > 0:
+                    self.cond.wait(remaining)
+                    continue
+                pending, self.targets = self.targets, {}
+                writes = {}
+                for channel, angle in pending.items():
+                    last = self.written.get(channel)
+                    if last is not None and abs(angle - last) < self.resolution:
+                        self.counters["skipped"] += 1
+                        continue
+                    writes[channel] = angle
+                self.busy = True
+
+            for channel, angle in writes.items():
+                try:
+                    self.kit.servo[channel].angle = angle
+                except Exception as e:
+                    print(f"⚠️ 馬達寫入失敗 (ch {channel}): {e}")
+
+            with self.cond:
+                self.written.update(writes)
+                self.counters["written"] += len(writes)
+                self.busy = False
+                if writes:
+                    self.last_write = time.monotonic()
+                self.cond.notify_all()
+
+class ActuatorTimeline:
+    """
+    依時間排程的馬達動作 (單一執行緒)
+    呼叫端只登記「幾秒後做什麼」，不會 sleep
+    """
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.heap = []
+        self.counter = itertools.count() # 同時間的動作依登記順序執行
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name="actuator-timeline", daemon=True)
+        self.thread.start()
+
+    def schedule(self, delay, fn, *args):
+        with self.cond:
+            heapq.heappush(self.heap, (time.monotonic() + delay, next(self.counter), fn, args))
+            self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout=1.0)
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.heap or not self.running)
+                if not self.running: return
+                remaining = self.heap[0][0] - time.monotonic()
+                if remaining > 0:
+                    self.cond.wait(remaining)
+                    continue
+                _, _, fn, args = heapq.heappop(self.heap)
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"⚠️ 排程動作失敗: {e}")
+
+class EngagementScheduler:
+    """
+    開火流程狀態機：AIM -> SETTLE -> FIRE -> SAFE -> IDLE
+    每一步都排在 ActuatorTimeline 上，視覺迴圈只送出意圖，不會被 sleep 卡住
+    """
+    IDLE, AIM, SETTLE, FIRE, SAFE = "IDLE", "AIM", "SETTLE", "FIRE", "SAFE"
+
+    def __init__(self, hardware, timeline):
+        self.hardware = hardware
+        self.timeline = timeline
+        self.lock = threading.Lock()
+        self.state = self.IDLE
+        self.on_done = None
+
+    @property
+    def idle(self):
+        return self.state == self.IDLE
+
+    def engage(self, pan_delta=0.0, tilt_delta=0.0, settle=config.ENGAGE_SETTLE, on_done=None):
+        """開始一次開火流程；正在進行中則回傳 False"""
+        with self.lock:
+            if self.state != self.IDLE: return False
+            self.state = self.AIM
+            self.on_done = on_done
+        if pan_delta or tilt_delta:
+            self.hardware.manual_move(pan_delta, tilt_delta)
+        self.state = self.SETTLE # 等馬達轉到位
+        self.timeline.schedule(settle, self._fire)
+        return True
+
+    def _fire(self):
+        self.state = self.FIRE
+        self.hardware.trigger(True)
+        self.timeline.schedule(config.FIRE_HOLD, self._safe)
+
+    def _safe(self):
+        self.state = self.SAFE
+        self.hardware.trigger(False)
+        self.timeline.schedule(config.ENGAGE_COOLDOWN, self._done)
+
+    def _done(self):
+        with self.lock:
+            self.state = self.IDLE
+            on_done, self.on_done = self.on_done, None
+        if on_done: on_done()
+
+PRIORITY_FIRE = 0
+PRIORITY_NORMAL = 1
+
+class ActuatorRequest:
+    """一筆致動器指令；wait() 取得結果 (status、latency 等)"""
+    def __init__(self, kind, source=""):
+        self.kind = kind
+        self.source = source
+        self.created = time.monotonic()
+        self.event = threading.Event()
+        self.result = None
+        self.followers = [] # 被合併進這筆的重複請求
+
+    def finish(self, status, value=None):
+        self.result = {
+            "kind": self.kind,
+            "status": status,
+            "value": value,
+            "latency_ms": round((time.monotonic() - self.created) * 1000, 2),
+        }
+        self.event.set()
+        for follower in self.followers:
+            follower.finish("merged", value)
+        self.followers = []
+
+    @property
+    def done(self):
+        return self.event.is_set()
+
+    def wait(self, timeout=None):
+        self.event.wait(timeout)
+        return self.result
+
+class ActuatorQueue:
+    """
+    單一工作執行緒 + 有上限的優先佇列
+    - 網頁、語音、Gemini 的開火請求都送到這裡，不再各自開執行緒
+    - 冷卻時間內 (或已在排隊中) 的重複開火請求合併成一次
+    - 佇列滿了直接回覆 dropped，執行緒數量固定
+    """
+    def __init__(self, hardware, maxsize=config.ACTUATOR_QUEUE_SIZE, debounce=config.FIRE_DEBOUNCE):
+        self.hardware = hardware
+        self.debounce = debounce
+        self.queue = queue.PriorityQueue(maxsize)
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.pending_fire = None
+        self.last_fire = None
+        self.last_fire_time = 0.0
+        self.counters = {"submitted": 0, "executed": 0, "merged": 0, "dropped": 0}
+        self.thread = threading.Thread(target=self._loop, name="actuator-queue", daemon=True)
+        self.thread.start()
+
+    def fire(self, source=""):
+        """送出開火請求 (非阻塞)，回傳 ActuatorRequest"""
+        with self.lock:
+            self.counters["submitted"] += 1
+            req = ActuatorRequest("fire", source)
+            original = self.pending_fire
+            if original is None and self.last_fire and time.monotonic() - self.last_fire_time < self.debounce:
+                original = self.last_fire
+            if original is not None:
+                self.counters["merged"] += 1
+                if original.done:
+                    req.finish("merged", original.result["value"])
+                else:
+                    original.followers.append(req)
+                return req
+            if self._put(PRIORITY_FIRE, req, self.hardware.fire_gun, ()):
+                self.pending_fire = req
+        return req
+
+    def submit(self, kind, fn, *args, priority=PRIORITY_NORMAL, source=""):
+        """送出一般指令 (非阻塞)，回傳 ActuatorRequest"""
+        req = ActuatorRequest(kind, source)
+        with self.lock:
+            self.counters["submitted"] += 1
+            self._put(priority, req, fn, args)
+        return req
+
+    def _put(self, priority, req, fn, args):
+        try:
+            self.queue.put_nowait((priority, next(self.counter), req, fn, args))
+            return True
+        except queue.Full:
+            self.counters["dropped"] += 1
+            req.finish("dropped")
+            return False
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, queued=self.queue.qsize())
+
+    def _loop(self):
+        while True:
+            _, _, req, fn, args = self.queue.get()
+            try:
+                value = fn(*args)
+                status = "done"
+                if req.kind == "fire":
+                    status = "fired" if value else "busy" # busy: 上一發還沒結束
+            except Exception as e:
+                print(f"⚠️ 致動器指令失敗 ({req.kind}): {e}")
+                value, status = None, "error"
+            with self.lock:
+                self.counters["executed"] += 1
+                if req is self.pending_fire:
+                    self.pending_fire = None
+                    self.last_fire, self.last_fire_time = req, time.monotonic()
+                req.finish(status, value)
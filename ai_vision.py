@@ -1,12 +1,20 @@
 import cv2
 import json
+import numpy as np
 import time
 import threading
 import google.generativeai as genai
 from pycoral.adapters import common
-from pycoral.adapters import detect
 from pycoral.utils.edgetpu import make_interpreter, list_edge_tpus
 import config
+from camera import CameraStream
+from inference import InferencePipeline, TensorInput
+from detection import DetectionPostprocessor, person_roi, PERSON_ID
+from scheduler import MotionScheduler
+from tracking import MultiObjectTracker, TemplateReacquirer, ScaledTracker, select_tracker_backend
+from sentry import SedentaryTable
+from gemini import GeminiSearch, IntentCache, PayloadShaper
+from label_index import LabelIndex, read_coco_labels
 
 class VisionSystem:
     def __init__(self, state, hardware, audio):
@@ -19,19 +27,32 @@ class VisionSystem:
         self.tracker = None
         self.labels_map = {}
         self.name_to_id = {}
+        self.postprocessor = DetectionPostprocessor(threshold=0.5)
+        self.person_box = None # 目前選定的人 (MoveNet ROI 用)
+        self.engaged_track_id = None # 哨兵模式正在處理的人 (track ID)
+        self.scheduler = MotionScheduler()
+        if config.MOTION_GATING:
+            self.state.register_stats("inference", self.scheduler.stats)
+        self.object_tracker = MultiObjectTracker() # SSD 偵測結果的多目標追蹤 (持續的 track ID)
         
         # Sentry Mode Variables
-        self.sentry_timer = 0
-        self.sentry_last_check = time.time()
-        self.sentry_last_cx = None
-        self.sentry_last_cy = None
+        self.sedentary = SedentaryTable() # 每個人各自的靜止計時
         self.patrol_direction = 1
         self.patrol_last_move = time.time()
-        self.half_time_warned = False # 避免重複警告
         
         self._init_tpus()
         self._init_gemini()
         self._load_labels()
+        self._init_pipeline()
+        self._init_tracker_backend()
+        self.gemini_search = GeminiSearch(self.ask_gemini_coordinates)
+        self.intent_cache = IntentCache()
+        self.state.register_stats("intent_cache", self.intent_cache.stats)
+        self.payload_shaper = PayloadShaper()
+        self.state.register_stats("gemini_payload", self.payload_shaper.stats)
+        self.reacquirer = TemplateReacquirer() # GEMINI_TRACK 追丟時的本地重新偵測
+        self.lost_since = None
+        self.telemetry = {"time": 0.0, "frames": 0, "status": None, "sentry": {}} # 上次推送的遙測
 
     def _init_tpus(self):
         # 取得所有可用的 TPU
@@ -68,6 +89,16 @@ class VisionSystem:
             print("🚫 MoveNet 功能已在設定中停用")
 
     # 舊的初始化函式已整合至 _init_tpus，移除 _init_coral 與 _init_posenet
+
+    def _init_pipeline(self):
+        # 兩顆 TPU 各自一個 worker，同一幀可以同時跑 SSD 與 MoveNet
+        self.pipeline = InferencePipeline()
+        if self.interpreter:
+            self.detector_input = TensorInput(self.interpreter)
+            self.pipeline.add_stage("detect", self._run_detector)
+        if self.movenet_interpreter:
+            self.movenet_input = TensorInput(self.movenet_interpreter)
+            self.pipeline.add_stage("movenet", self._run_movenet)
     
     def _init_gemini(self):
         if config.GEMINI_API_KEY:
@@ -78,14 +109,12 @@ class VisionSystem:
 
     def _load_labels(self):
         try:
-            with open(config.LABEL_PATH, 'r') as f:
-                for line in f:
-                    if line.strip():
-                        pid, name = line.strip().split(maxsplit=1)
-                        self.labels_map[int(pid)] = name
-                        self.name_to_id[name] = int(pid)
-        except:
-            pass
+            self.labels_map = read_coco_labels(config.LABEL_PATH)
+            self.name_to_id = {name: pid for pid, name in self.labels_map.items()}
+        except Exception as e:
+            print(f"⚠️ 標籤檔讀取失敗: {e}")
+        # 中英文別名索引 (語音指令找 Coral 追蹤目標用)
+        self.label_index = LabelIndex(self.labels_map)
 
     def ask_gemini_intent(self, text):
         """
@@ -93,6 +122,12 @@ class VisionSystem:
         """
         if not self.gemini_model: return None
         
+        # 同一句話 (常見的誤聽) 直接用快取，不必再走一趟網路
+        cached = self.intent_cache.get(text)
+        if cached is not None:
+            print(f"🗂️ 意圖快取命中: {text} -> {cached} ({self.intent_cache.stats()['hit_rate']:.0%})")
+            return cached
+        
         prompt = f"""
         你是 AI 哨兵砲台的大腦。使用者說了: "{text}"。
         這可能是語音辨識錯誤 (諧音) 或模糊指令。請推測使用者的意圖並回傳 JSON。
@@ -117,40 +152,132 @@ class VisionSystem:
                 prompt,
                 generation_config={"response_mime_type": "application/json"}
             )
-            return json.loads(response.text)
+            intent_data = json.loads(response.text)
+            self.intent_cache.put(text, intent_data)
+            return intent_data
         except Exception as e:
             print(f"Gemini Intent Error: {e}")
             return None
 
     def ask_gemini_coordinates(self, frame, prompt):
+        """frame 應為還沒畫上 HUD 的乾淨畫面；酬載大小、裁切與品質由 PayloadShaper 決定"""
+        payload, found = None, False
+        t0 = time.monotonic()
         try:
-            ret, buffer = cv2.imencode('.jpg', frame)
+            payload, transform = self.payload_shaper.encode(frame)
             full_prompt = f"找出畫面中'{prompt}'。回傳純JSON: {{ \"box_2d\": [ymin, xmin, ymax, xmax] }} (0-1000)。找不到回傳 null。"
+            t0 = time.monotonic()
             response = self.gemini_model.generate_content(
-                [full_prompt, {'mime_type': 'image/jpeg', 'data': buffer.tobytes()}],
+                [full_prompt, {'mime_type': 'image/jpeg', 'data': payload}],
                 generation_config={"response_mime_type": "application/json"}
             )
             data = json.loads(response.text)
-            if data.get("box_2d"):
-                h, w = frame.shape[:2]
-                ymin, xmin, ymax, xmax = data["box_2d"]
-                return (int(xmin/1000*w), int(ymin/1000*h), int((xmax-xmin)/1000*w), int((ymax-ymin)/1000*h))
+            if data and data.get("box_2d"):
+                box = self.payload_shaper.to_frame(data["box_2d"], transform)
+                found = True
+                return box
         except Exception as e:
             print(f"Gemini Error: {e}")
+        finally:
+            # 逾時 / 錯誤也要記錄，否則統計只看得到成功的請求
+            if payload is not None:
+                self.payload_shaper.record(len(payload), time.monotonic() - t0, found)
         return None
 
-    def _run_movenet(self, frame):
+    def _read_ssd_outputs(self):
+        """
+        直接讀取 SSD postprocess 的四個輸出張量 (與 pycoral detect.get_objects 相同的判斷方式)
+        回傳 boxes, class_ids, scores, count
+        """
+        signature_list = self.interpreter._get_full_signature_list()
+        if signature_list:
+            outputs = signature_list[next(iter(signature_list))]['outputs']
+            count = self.interpreter.tensor(outputs['output_0'])()[0]
+            scores = self.interpreter.tensor(outputs['output_1'])()[0]
+            class_ids = self.interpreter.tensor(outputs['output_2'])()[0]
+            boxes = self.interpreter.tensor(outputs['output_3'])()[0]
+        elif common.output_tensor(self.interpreter, 3).size == 1:
+            boxes = common.output_tensor(self.interpreter, 0)[0]
+            class_ids = common.output_tensor(self.interpreter, 1)[0]
+            scores = common.output_tensor(self.interpreter, 2)[0]
+            count = common.output_tensor(self.interpreter, 3)[0]
+        else:
+            scores = common.output_tensor(self.interpreter, 0)[0]
+            boxes = common.output_tensor(self.interpreter, 1)[0]
+            count = common.output_tensor(self.interpreter, 2)[0]
+            class_ids = common.output_tensor(self.interpreter, 3)[0]
+        return boxes, class_ids, scores, count
+
+    def _init_tracker_backend(self):
+        # 啟動時自我測試，選出時間預算內最準的 tracker
+        self.tracker_backend, cost_ms = select_tracker_backend()
+        if self.tracker_backend is None:
+            print("❌ 找不到任何可用的 OpenCV tracker，GEMINI_TRACK 無法使用")
+            return
+        tracker_info = {
+            "backend": self.tracker_backend,
+            "cost_ms": round(cost_ms, 2),
+            "scale": config.TRACKER_SCALE,
+            "budget_ms": config.TRACKER_BUDGET_MS,
+        }
+        self.state.register_stats("tracker", lambda: tracker_info)
+        print(f"✅ Tracker: {self.tracker_backend} (縮放 {config.TRACKER_SCALE}, 約 {cost_ms:.1f} ms/frame, 預算 {config.TRACKER_BUDGET_MS} ms)")
+
+    def _publish_telemetry(self, now, frame_count, sentry_timers):
+        """只在數值改變時推送遙測事件 (哨兵計時每秒一跳；FPS / 雲台角度每 TELEMETRY_INTERVAL 秒檢查一次)"""
+        t = self.telemetry
+        if sentry_timers != t["sentry"]:
+            t["sentry"] = sentry_timers
+            self.state.events.publish("sentry", sentry_timers)
+
+        elapsed = now - t["time"]
+        if elapsed < config.TELEMETRY_INTERVAL: return
+        fps = (frame_count - t["frames"]) / elapsed if t["time"] else 0.0
+        t["time"], t["frames"] = now, frame_count
+        status = {
+            "fps": round(fps),
+            "pan": round(self.hardware.pan_angle),
+            "tilt": round(self.hardware.tilt_angle),
+        }
+        if status != t["status"]:
+            t["status"] = status
+            self.state.events.publish("status", status)
+
+    def _engagement_done(self, track_id):
+        # 在致動器時間軸的執行緒呼叫
+        print(f"✅ 目標 #{track_id} 處理完成，繼續監視其他人")
+        if self.engaged_track_id == track_id:
+            self.engaged_track_id = None
+
+    def _create_tracker(self):
+        return ScaledTracker(self.tracker_backend, config.TRACKER_SCALE)
+
+    def _run_detector(self, frame):
+        """
+        執行 SSD 物件偵測，回傳原始輸出張量的副本 (boxes, class_ids, scores, count)
+        副本很小 (最多數十筆)，下一次 invoke 不會覆蓋掉
+        """
+        self.detector_input.load(frame) # 直接縮放進 300x300 輸入張量
+        self.interpreter.invoke()
+        return tuple(np.array(t) for t in self._read_ssd_outputs())
+
+    def _run_movenet(self, frame, roi=None):
         """
         執行 MoveNet 推論並檢查是否舉手投降
         MoveNet Output: [1, 1, 17, 3] (y, x, score)
+        roi: (x0, y0, side) 只對人物區域推論，遠處的人也有足夠的解析度；回傳的關鍵點一律換算回整張畫面的正規化座標
         """
         if not self.movenet_interpreter: return False, [], []
+        # ROI 模式下沒有人物框就不推論 (避免整張畫面被送進 MoveNet)
+        if config.MOVENET_USE_ROI and roi is None: return False, [], []
         
         try:
-            # 1. Resize and set input (MoveNet Lightning is 192x192)
-            input_size = (192, 192) 
-            resized = cv2.resize(frame, input_size)
-            common.set_input(self.movenet_interpreter, resized)
+            # 1. Resize directly into the input tensor (MoveNet Lightning is 192x192)
+            image = frame
+            if roi is not None:
+                x0, y0, side = roi
+                image = frame[y0:y0+side, x0:x0+side] # view，不複製
+            self.movenet_input.load(image)
             
             # 2. Inference
             self.movenet_interpreter.invoke()
@@ -167,8 +294,13 @@ class VisionSystem:
             keypoints = []
             scores = []
             
+            h, w = frame.shape[:2]
             for k in keypoints_with_scores:
                 y, x, score = k
+                if roi is not None:
+                    # ROI 內的正規化座標 -> 整張畫面的正規化座標
+                    y = (y0 + y * side) / h
+                    x = (x0 + x * side) / w
                 keypoints.append((y, x))
                 scores.append(score)
             
@@ -194,41 +326,61 @@ class VisionSystem:
             return False, [], []
 
     def run_loop(self):
-        cap = cv2.VideoCapture(0)
-        cap.set(3, 640)
-        cap.set(4, 480)
+        # 擷取在獨立執行緒進行，這裡只拿最新的一幀
+        camera = CameraStream(config.CAMERA_INDEX, 640, 480).start()
         
         print("🚀 視覺系統啟動！")
         
-        fail_count = 0
+        last_seq = 0
         frame_count = 0
         
         while self.state.running:
-            success, frame = cap.read()
-            if not success: 
-                fail_count += 1
-                if fail_count % 10 == 0:
-                    print(f"⚠️ 攝影機讀取失敗 ({fail_count} 次)，嘗試重啟...")
-                    cap.release()
-                    time.sleep(1)
-                    cap = cv2.VideoCapture(0)
-                    cap.set(3, 640)
-                    cap.set(4, 480)
-                else:
-                    time.sleep(0.1)
+            packet = camera.read(last_seq, timeout=1.0)
+            if packet is None:
                 continue
             
-            fail_count = 0
+            last_seq = packet.seq
+            frame = packet.image
             frame_count += 1
             
             mode = self.state.current_mode
 
-            # --- MoveNet Logic (每 N 幀跑一次) ---
+            # Gemini 相關模式需要沒有 HUD 的乾淨畫面 (送給 Gemini、追蹤器使用)
+            clean_frame = None
+            if mode in ("GEMINI_SEARCH", "GEMINI_TRACK") or self.gemini_search.pending():
+                clean_frame = frame.copy()
+            if mode != "GEMINI_SEARCH" and self.gemini_search.pending():
+                # 使用者已切換模式，放棄還在等的搜尋
+                self.gemini_search.cancel()
+
+            # --- 推論 (SSD 與 MoveNet 在兩顆 TPU 上同時執行) ---
+            # 在畫任何 HUD 之前送出，模型看到的是乾淨的畫面
             if not hasattr(self, 'last_movenet_result'):
                 self.last_movenet_result = (False, [], [])
 
-            if self.movenet_interpreter and frame_count % config.MOVENET_SKIP_FRAMES == 0:
-                self.last_movenet_result = self._run_movenet(frame)
+            if config.MOTION_GATING:
+                run_ssd, run_movenet = self.scheduler.decide(frame, packet.timestamp, mode, self.movenet_interpreter is not None)
+            else:
+                run_ssd = frame_count % config.SSD_SKIP_FRAMES == 0
+                run_movenet = frame_count % config.MOVENET_SKIP_FRAMES == 0
+
+            stages = ["detect"] if run_ssd else []
+            stage_args = {}
+            if self.movenet_interpreter and run_movenet:
+                if not config.MOVENET_USE_ROI:
+                    stages.append("movenet")
+                elif self.person_box is not None:
+                    # 用上一次 SSD 的人物框裁切 (與 SSD 平行執行，外擴的邊界足以涵蓋一幀內的移動)
+                    stages.append("movenet")
+                    stage_args["movenet"] = (person_roi(self.person_box, frame.shape, config.MOVENET_ROI_PADDING),)
+                else:
+                    # 畫面裡沒有人就不必浪費一次 TPU 推論
+                    self.last_movenet_result = (False, [], [])
+            # 兩個模型都被排程略過時不送任何推論，下方由 Kalman 預測補上
+            results = self.pipeline.run(packet.seq, frame, stages, args=stage_args) if stages else {}
+
+            if results.get("movenet") is not None:
+                self.last_movenet_result = results["movenet"]
             
             is_surrender, keypoints, scores = self.last_movenet_result
 
@@ -293,116 +445,99 @@ class VisionSystem:
 
             # --- Object Detection (Always Run for Visualization) ---
             coral_target = None
-            if self.interpreter:
-                common.set_input(self.interpreter, cv2.resize(frame, (300, 300)))
-                self.interpreter.invoke()
-                objs = detect.get_objects(self.interpreter, 0.5)
-                
-                h, w = frame.shape[:2]
-                for obj in objs:
-                    bbox = obj.bbox
-                    xmin, ymin = int(bbox.xmin*w/300), int(bbox.ymin*h/300)
-                    xmax, ymax = int(bbox.xmax*w/300), int(bbox.ymax*h/300)
-                    
-                    # Draw Box & Label
-                    label = self.labels_map.get(obj.id, str(obj.id))
-                    
-                    # Visualization Filter: Only show person in IDLE/SENTRY modes
-                    show_box = True
-                    if mode in ["IDLE", "SENTRY_MODE"] and obj.id != 0:
-                        show_box = False
-                        
-                    if show_box:
-                        cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
-                        cv2.putText(frame, f"{label} {obj.score:.2f}", (xmin, ymin-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-                    # Check if this is the target we want to track
-                    if mode == "CORAL_TRACK" and obj.id == self.state.target_config['id']:
-                        # Pick the first one (highest score)
-                        if coral_target is None:
-                            coral_target = (xmin, ymin, xmax, ymax)
-                    
-                    # Sentry Mode: Track Person (ID 0 is usually person in COCO)
-                    if mode == "SENTRY_MODE" and obj.id == 0:
-                         if coral_target is None:
-                            coral_target = (xmin, ymin, xmax, ymax)
+            sentry_timers = {} # 推送給網頁的哨兵計時 (track id -> 秒)
+            target_id = self.state.target_config['id']
+            if results.get("detect") is not None:
+                dets = self.postprocessor.process(*results["detect"], frame.shape)
+                tracks = self.object_tracker.update(dets.boxes, dets.class_ids, dets.scores, packet.timestamp)
+            else:
+                # 這幀沒跑偵測，由 Kalman 預測補上
+                tracks = self.object_tracker.predict(packet.timestamp)
+
+            # 只有目前模式要顯示的類別才繪製
+            visible = self.postprocessor.visible_mask(mode)
+            for t in tracks:
+                if not visible[t.class_id]: continue
+                xmin, ymin, xmax, ymax = t.box()
+                label = self.labels_map.get(t.class_id, str(t.class_id))
+                cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
+                cv2.putText(frame, f"{label} #{t.id} {t.score:.2f}", (xmin, ymin-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+            # CORAL_TRACK 追指定類別、SENTRY_MODE 追人；鎖定後維持同一個 track ID，不會每幀換人
+            target = self.object_tracker.select_target(self.postprocessor.target_class(mode, target_id))
+            if target:
+                coral_target = target.box()
+
+            # MoveNet 要檢查的是被瞄準的那個人：正在處理的人 > 鎖定的目標 (是人的話) > 分數最高的人
+            person = self.object_tracker.get(self.engaged_track_id) if self.engaged_track_id is not None else None
+            if person is None and target is not None and target.class_id == PERSON_ID:
+                person = target
+            if person is None:
+                person = self.object_tracker.best(PERSON_ID)
+            self.person_box = person.box() if person else None
 
             # --- Control Logic ---
             if mode == "CORAL_TRACK" and coral_target:
                 xmin, ymin, xmax, ymax = coral_target
                 # Highlight the target being tracked with a different color
                 cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 0, 255), 3)
-                self.hardware.update_servos((xmin+xmax)//2, (ymin+ymax)//2)
+                self.hardware.update_servos((xmin+xmax)//2, (ymin+ymax)//2, packet.timestamp)
 
             elif mode == "SENTRY_MODE":
-                if coral_target:
-                    # 1. Get coordinates (Don't move servos yet)
-                    xmin, ymin, xmax, ymax = coral_target
-                    cx, cy = (xmin+xmax)//2, (ymin+ymax)//2
-                    cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 0, 255), 3)
-                    
-                    # 2. Check Stationary Status (Pixel based)
+                people = [t for t in tracks if t.class_id == PERSON_ID]
+                if people:
+                    # 1. Update every person's stationary timer (Don't move servos yet)
                     now = time.time()
-                    if now - self.sentry_last_check >= 1.0: # Check every second
-                        # Calculate distance from last check
-                        if self.sentry_last_cx is None:
-                             dist = 0 
-                             self.sentry_timer = 0
-                        else:
-                             dist = ((cx - self.sentry_last_cx)**2 + (cy - self.sentry_last_cy)**2)**0.5
-                        
-                        # Threshold: config.SENTRY_MOVE_THRESHOLD is in degrees. 
-                        # Approx conversion: 1 degree ~ 10 pixels
-                        pixel_threshold = config.SENTRY_MOVE_THRESHOLD * 10
-                        
-                        if self.sentry_last_cx is not None and dist < pixel_threshold:
-                            self.sentry_timer += 1
-                        else:
-                            self.sentry_timer = 0 # Reset if moved
-                            self.half_time_warned = False # 重置警告標記
-                            
-                        self.sentry_last_cx = cx
-                        self.sentry_last_cy = cy
-                        self.sentry_last_check = now
+                    self.sedentary.update(people, now)
+                    visible_people = self.sedentary.visible(now)
+                    sentry_timers = {entry.track_id: entry.timer for entry in visible_people}
                     
-                    # 3. Draw Timer
-                    color = (0, 255, 0)
-                    if self.sentry_timer > config.SENTRY_TIMEOUT / 2: 
-                        color = (0, 255, 255)
-                        # 播放警告音效 (只播放一次)
-                        if not self.half_time_warned:
-                            self.audio.warning_half_time()
-                            self.half_time_warned = True
-                            
-                    if self.sentry_timer > config.SENTRY_TIMEOUT - 10: color = (0, 0, 255)
+                    # 2. Half-time warning (once per person)
+                    for entry in self.sedentary.due_warnings(now):
+                        self.audio.warning_half_time()
+                        entry.warned = True
                     
-                    timer_text = f"STATIONARY: {self.sentry_timer}s / {config.SENTRY_TIMEOUT}s"
-                    cv2.putText(frame, timer_text, (xmin, ymin - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+                    # 3. Draw Timers
+                    for entry in visible_people:
+                        xmin, ymin, xmax, ymax = entry.box
+                        color = (0, 255, 0)
+                        if entry.timer > config.SENTRY_TIMEOUT / 2: color = (0, 255, 255)
+                        if entry.timer > config.SENTRY_TIMEOUT - 10: color = (0, 0, 255)
+                        
+                        timer_text = f"#{entry.track_id} STATIONARY: {entry.timer}s / {config.SENTRY_TIMEOUT}s"
+                        cv2.putText(frame, timer_text, (xmin, ymin - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
                     
-                    # 4. Fire if timeout
-                    if self.sentry_timer >= config.SENTRY_TIMEOUT:
+                    # 4. Fire if timeout (one person at a time, others wait their turn)
+                    if not self.hardware.engagement.idle:
+                        # 開火流程進行中 (瞄準 / 等待 / 開火)，追蹤與串流照常
                         cv2.putText(frame, "ELIMINATING TARGET...", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
-                        
-                        # AIM NOW (Quickly center the target)
-                        # Estimate move: 1 pixel ~ 0.1 degrees
-                        # Fix: Changed to (CY - cy) to match Positive KP (Negative Delta = Look Down)
-                        pan_delta = (cx - config.CX) * -0.1 
-                        tilt_delta = (config.CY - cy) * 0.1
-                        self.hardware.manual_move(pan_delta, tilt_delta)
-                        time.sleep(0.5) # Wait for servo
-                        
-                        self.hardware.fire_gun()
-                        self.sentry_timer = 0 
-                        self.state.current_mode = "IDLE" # Switch to IDLE
-                        print("✅ 任務完成，切換回閒置模式")
+                    else:
+                        target = self.sedentary.next_target(now)
+                        if target:
+                            xmin, ymin, xmax, ymax = target.box
+                            cx, cy = (xmin+xmax)//2, (ymin+ymax)//2
+                            cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 0, 255), 3)
+                            cv2.putText(frame, "ELIMINATING TARGET...", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
+                            
+                            # AIM NOW (Quickly center the target)
+                            # Estimate move: 1 pixel ~ 0.1 degrees
+                            # Fix: Changed to (CY - cy) to match Positive KP (Negative Delta = Look Down)
+                            pan_delta = (cx - config.CX) * -0.1 
+                            tilt_delta = (config.CY - cy) * 0.1
+                            # 只送出意圖：瞄準 -> 等馬達到位 -> 開火 -> 收回，都在致動器時間軸上進行
+                            track_id = target.track_id
+                            self.engaged_track_id = track_id # 先記下，on_done 可能在另一條執行緒很快被呼叫
+                            if not self.hardware.engage(pan_delta, tilt_delta, on_done=lambda: self._engagement_done(track_id)):
+                                self.engaged_track_id = None
+                            target.reset()
                 else:
                     # No person found -> Patrol Mode (Slow Pan)
-                    self.sentry_timer = 0
-                    self.sentry_last_cx = None # Reset tracking
+                    self.sedentary.update([], time.time()) # 只讓過期的紀錄自然移除
                     cv2.putText(frame, "SCANNING AREA...", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
                     
                     now = time.time()
-                    if now - self.patrol_last_move > 0.1: # Move every 100ms
+                    # 開火流程 (瞄準 / 等待 / 開火 / 收回) 進行中不巡邏，避免射擊途中轉動雲台
+                    if self.hardware.engagement.idle and now - self.patrol_last_move > 0.1: # Move every 100ms
                         # Simple patrol: Pan between MIN and MAX
                         # We need to access hardware pan limits, assuming they are in config or hardware
                         # Let's use safe limits 30-110
@@ -415,51 +550,76 @@ class VisionSystem:
                         self.patrol_last_move = now
 
             elif mode == "GEMINI_SEARCH":
-                cv2.putText(frame, "AI ANALYZING...", (200, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
-                # Update output frame so user sees "Analyzing"
-                with self.state.lock: self.state.output_frame = frame.copy()
-                
-                bbox = self.ask_gemini_coordinates(frame, self.state.gemini_prompt)
-                if bbox:
-                    # Shrink bbox by 20% to avoid background tracking drift
-                    x, y, w, h = bbox
-                    shrink_factor = 0.2
-                    new_x = int(x + w * shrink_factor / 2)
-                    new_y = int(y + h * shrink_factor / 2)
-                    new_w = int(w * (1 - shrink_factor))
-                    new_h = int(h * (1 - shrink_factor))
-                    bbox = (new_x, new_y, new_w, new_h)
-
-                    # OpenCV 4.5+ moved trackers to legacy or contrib
-                    try:
-                        self.tracker = cv2.TrackerCSRT_create()
-                    except AttributeError:
-                        # Fallback for newer OpenCV versions
-                        try:
-                            self.tracker = cv2.legacy.TrackerCSRT_create()
-                        except AttributeError:
-                             # Fallback to a simpler tracker if CSRT is missing
-                             print("⚠️ CSRT Tracker not found, using MIL")
-                             self.tracker = cv2.TrackerMIL_create()
-                             
-                    self.tracker.init(frame, bbox)
-                    self.state.current_mode = "GEMINI_TRACK"
+                prompt = self.state.gemini_prompt
+                if not self.gemini_search.pending() or self.gemini_search.prompt != prompt:
+                    # 新的搜尋目標會取代還沒回來的舊請求
+                    self.gemini_search.submit(clean_frame, packet.timestamp, prompt)
                 else:
-                    self.state.current_mode = "IDLE"
+                    self.gemini_search.buffer(clean_frame, packet.timestamp)
+                
+                cv2.putText(frame, f"AI ANALYZING... {self.gemini_search.elapsed():.1f}s", (150, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
+                
+                result = self.gemini_search.poll()
+                if result:
+                    bbox, request_frame, buffered = result
+                    if bbox:
+                        # Shrink bbox by 20% to avoid background tracking drift
+                        x, y, w, h = bbox
+                        shrink_factor = 0.2
+                        new_x = int(x + w * shrink_factor / 2)
+                        new_y = int(y + h * shrink_factor / 2)
+                        new_w = int(w * (1 - shrink_factor))
+                        new_h = int(h * (1 - shrink_factor))
+                        bbox = (new_x, new_y, new_w, new_h)
+
+                        # 在 bbox 所屬的那一幀初始化，再用暫存的畫面追到現在
+                        self.tracker = self._create_tracker()
+                        self.tracker.init(request_frame, bbox)
+                        # Gemini 確認過的外觀，追丟時用來本地重新偵測
+                        self.reacquirer.init(request_frame, bbox)
+                        caught_up, tracked = True, bbox
+                        for past in buffered + [clean_frame]:
+                            caught_up, tracked = self.tracker.update(past)
+                            if not caught_up: break
+                        if caught_up:
+                            self.reacquirer.update_box(tracked)
+                            self.lost_since = None
+                        self.state.current_mode = "GEMINI_TRACK" if caught_up else "IDLE"
+                    else:
+                        self.state.current_mode = "IDLE"
 
             elif mode == "GEMINI_TRACK" and self.tracker:
-                success, bbox = self.tracker.update(frame)
+                success, bbox = self.tracker.update(clean_frame)
+                if not success:
+                    # 先在附近用樣板比對找回來，找不回來才重新詢問 Gemini
+                    if self.lost_since is None:
+                        self.lost_since = packet.timestamp
+                    found = self.reacquirer.search(clean_frame)
+                    if found:
+                        self.tracker = self._create_tracker()
+                        self.tracker.init(clean_frame, found)
+                        success, bbox = True, found
+                    elif packet.timestamp - self.lost_since > config.REACQUIRE_TIMEOUT:
+                        print("⚠️ 本地找不回目標，重新請 Gemini 搜尋")
+                        self.lost_since = None
+                        self.state.current_mode = "GEMINI_SEARCH" if self.state.gemini_prompt else "IDLE"
+                    else:
+                        cv2.putText(frame, "REACQUIRING...", (200, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 255), 3)
+
                 if success:
+                    self.lost_since = None
+                    self.reacquirer.update_box(bbox)
                     x, y, w, h = [int(v) for v in bbox]
                     cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 255), 2)
-                    self.hardware.update_servos(x+w//2, y+h//2)
-                else:
-                    self.state.current_mode = "IDLE"
+                    self.hardware.update_servos(x+w//2, y+h//2, packet.timestamp)
 
             # Crosshair
             cv2.line(frame, (config.CX-20, config.CY), (config.CX+20, config.CY), (200, 200, 200), 1)
             cv2.line(frame, (config.CX, config.CY-20), (config.CX, config.CY+20), (200, 200, 200), 1)
             
-            with self.state.lock: self.state.output_frame = frame.copy()
+            # 直接以參考發佈，之後不再修改這塊 buffer
+            self.state.frames.publish(frame, packet.timestamp)
+            self._publish_telemetry(packet.timestamp, frame_count, sentry_timers)
         
-        cap.release()
+        self.pipeline.stop()
+        camera.stop()
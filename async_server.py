@@ -0,0 +1,246 @@
+import json
+import time
+import asyncio
+import threading
+from urllib.parse import urlsplit, parse_qs
+import config
+from streaming import BOUNDARY, ClientStream, MJPEGBroadcaster, parse_stream_args
+from control_channel import ControlChannel, apply_command, HAS_WEBSOCKETS
+
+if HAS_WEBSOCKETS:
+    from websockets.asyncio.server import serve as ws_serve
+    from websockets.exceptions import ConnectionClosed
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+class AsyncServer:
+    """
+    asyncio 版的網頁伺服器 (SERVER_MODE=async)
+    - 首頁、/video_feed、/events、/cmd、/voice_log 與 WebSocket 控制通道都在同一個 event loop
+    - 每個觀看者只是一個 coroutine + 一份 JPEG bytes 的參考，不佔用 OS 執行緒
+    - JPEG 編碼仍由 MJPEGBroadcaster 的執行緒負責；新畫面 / 新事件以 call_soon_threadsafe 通知 event loop
+    """
+    def __init__(self, state, hardware, audio, broadcaster=None):
+        self.state = state
+        self.hardware = hardware
+        self.audio = audio
+        self.broadcaster = broadcaster or MJPEGBroadcaster(state.frames)
+        self.control = ControlChannel(state, hardware, audio)
+        self.loop = None
+        self.jpeg_version = 0
+        self.jpeg_cache = {}
+        self.jpeg_event = None # 每個新版本 set 一次後換新的
+        self.event_seq = 0
+        self.event_event = None
+        self.viewers = 0
+        self.routes = {
+            "/": self._index,
+            "/video_feed": self._video_feed,
+            "/cmd": self._cmd,
+            "/events": self._events,
+            "/voice_log": self._voice_log,
+            "/stats": self._stats,
+        }
+
+    def run(self, host="0.0.0.0", port=5000):
+        asyncio.run(self.serve(host, port))
+
+    async def serve(self, host, port, ready=None):
+        self.loop = asyncio.get_running_loop()
+        self.jpeg_event = asyncio.Event()
+        self.event_event = asyncio.Event()
+        self.broadcaster.add_listener(self._on_jpeg)
+        threading.Thread(target=self._event_bridge, name="events-bridge", daemon=True).start()
+
+        server = await asyncio.start_server(self._handle_http, host, port)
+        print(f"✅ asyncio 網頁伺服器: http://{host}:{port}")
+        tasks = [server.serve_forever()]
+        if HAS_WEBSOCKETS and config.CONTROL_WS_PORT:
+            ws_server = await ws_serve(self._handle_ws, host, config.CONTROL_WS_PORT)
+            tasks.append(ws_server.serve_forever())
+            print(f"✅ WebSocket 控制通道: ws://{host}:{config.CONTROL_WS_PORT}")
+        if ready: ready.set()
+        await asyncio.gather(*tasks)
+
+    # --- 執行緒 -> event loop ---
+    def _on_jpeg(self, version, cache):
+        # 在 broadcaster 的編碼執行緒呼叫
+        self.loop.call_soon_threadsafe(self._publish_jpeg, version, cache)
+
+    def _publish_jpeg(self, version, cache):
+        self.jpeg_version, self.jpeg_cache = version, cache
+        event, self.jpeg_event = self.jpeg_event, asyncio.Event()
+        event.set()
+
+    def _event_bridge(self):
+        # 等待遙測事件，有新事件才喚醒 event loop (閒置時不做任何事)
+        events = self.state.events
+        last = events.seq
+        while self.state.running:
+            with events.cond:
+                events.cond.wait_for(lambda: events.seq > last, 1.0)
+                seq = events.seq
+            if seq != last:
+                last = seq
+                self.loop.call_soon_threadsafe(self._publish_event, seq)
+
+    def _publish_event(self, seq):
+        self.event_seq = seq
+        event, self.event_event = self.event_event, asyncio.Event()
+        event.set()
+
+    async def _wait_jpeg(self, last_version, key):
+        while not (self.jpeg_version > last_version and key in self.jpeg_cache):
+            await self.jpeg_event.wait()
+        return self.jpeg_version, self.jpeg_cache[key]
+
+    async def _wait_events(self, last_id, timeout):
+        async def newer():
+            while self.event_seq <= last_id and self.state.events.seq <= last_id:
+                await self.event_event.wait()
+        try:
+            await asyncio.wait_for(newer(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.state.events.since(last_id)
+
+    # --- HTTP ---
+    async def _handle_http(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+            url = urlsplit(target)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+            route = self.routes.get(url.path)
+            if method != "GET":
+                await self._respond(writer, 405, "Method Not Allowed")
+            elif route is None:
+                await self._respond(writer, 404, "Not Found")
+            else:
+                await route(writer, headers, query)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _write_head(self, writer, status, content_type, extra=""):
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                     f"Content-Type: {content_type}\r\n{extra}Connection: close\r\n\r\n".encode("latin-1"))
+
+    async def _respond(self, writer, status, body, content_type="text/plain; charset=utf-8"):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self._write_head(writer, status, content_type, f"Content-Length: {len(data)}\r\n")
+        writer.write(data)
+        await writer.drain()
+
+    async def _index(self, writer, headers, query):
+        from web_server import INDEX_HTML
+        ws_port = config.CONTROL_WS_PORT if HAS_WEBSOCKETS else 0
+        await self._respond(writer, 200, INDEX_HTML.replace("{{ ws_port }}", str(ws_port)), "text/html; charset=utf-8")
+
+    async def _video_feed(self, writer, headers, query):
+        try:
+            scale, quality, fps, adaptive = parse_stream_args(query)
+        except ValueError:
+            return await self._respond(writer, 400, "Bad stream parameters")
+
+        self._write_head(writer, 200, "multipart/x-mixed-replace; boundary=frame", "Cache-Control: no-cache\r\n")
+        client = ClientStream(scale, quality, fps, adaptive)
+        key = client.key()
+        self.broadcaster.subscribe(key)
+        self.viewers += 1
+        try:
+            version = 0
+            while True:
+                wait = client.throttle_delay()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                client.last_send = time.monotonic()
+                version, jpeg = await self._wait_jpeg(version, key)
+
+                t0 = time.monotonic()
+                writer.write(BOUNDARY)
+                writer.write(jpeg)
+                writer.write(b'\r\n')
+                await writer.drain()
+                client.record_send(len(jpeg), time.monotonic() - t0)
+
+                new_key = client.key()
+                if new_key != key:
+                    self.broadcaster.subscribe(new_key)
+                    self.broadcaster.unsubscribe(key)
+                    key = new_key
+        finally:
+            self.viewers -= 1
+            self.broadcaster.unsubscribe(key)
+
+    async def _cmd(self, writer, headers, query):
+        mode = query.get('mode')
+        result = apply_command(self.state, self.hardware, self.audio, mode, query.get('val'), query.get('axis'))
+        if mode == 'fire':
+            # 等開火結果不能卡住 event loop
+            data = await self.loop.run_in_executor(None, result.wait, 1.0)
+            return await self._respond(writer, 200, json.dumps(data), "application/json")
+        await self._respond(writer, 200, "OK")
+
+    async def _voice_log(self, writer, headers, query):
+        await self._respond(writer, 200, json.dumps(list(self.state.voice_logs), ensure_ascii=False), "application/json")
+
+    async def _stats(self, writer, headers, query):
+        await self._respond(writer, 200, json.dumps(self.state.stats_snapshot(), ensure_ascii=False), "application/json")
+
+    async def _events(self, writer, headers, query):
+        # 與 Flask 版 /events 相同的格式：Last-Event-ID 續傳、新連線先送快照
+        try:
+            last = int(headers.get('last-event-id') or query.get('last_id', 0))
+        except ValueError:
+            last = 0
+        self._write_head(writer, 200, "text/event-stream", "Cache-Control: no-cache\r\nX-Accel-Buffering: no\r\n")
+        pending, complete = self.state.events.since(last)
+        while self.state.running:
+            if not last or not complete:
+                last, snapshot = self.state.telemetry_snapshot()
+                writer.write(f"id: {last}\nevent: snapshot\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n".encode("utf-8"))
+            else:
+                for seq, kind, payload in pending:
+                    writer.write(f"id: {seq}\nevent: {kind}\ndata: {payload}\n\n".encode("utf-8"))
+                    last = seq
+            await writer.drain()
+            pending, complete = await self._wait_events(last, 15.0)
+            if complete and not pending:
+                writer.write(b": keepalive\n\n") # 閒置時每 15 秒一次，偵測斷線
+
+    # --- WebSocket 控制 ---
+    async def _handle_ws(self, websocket):
+        pending = []
+        arrived = asyncio.Event()
+
+        async def receive():
+            async for message in websocket:
+                pending.append(message)
+                arrived.set()
+
+        receiver = asyncio.ensure_future(receive())
+        try:
+            while True:
+                waiter = asyncio.ensure_future(arrived.wait())
+                await asyncio.wait({receiver, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if not pending: break # 連線已關閉
+                # 處理期間到達的訊息會累積在 pending，下一批一起合併
+                batch = pending[:]
+                pending.clear()
+                arrived.clear()
+                ack = await self.loop.run_in_executor(None, self.control.apply_batch, batch)
+                await websocket.send(json.dumps(ack))
+        except ConnectionClosed:
+            pass
+        finally:
+            receiver.cancel()
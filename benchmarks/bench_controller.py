@@ -0,0 +1,92 @@
+"""
+追蹤控制器模擬：原本的比例步進 (StepController) vs 延遲補償 PID (LatencyCompensatedController)
+
+模擬 30 FPS 攝影機、偵測延遲、伺服馬達的轉速上限與一階延遲，
+以「真實」的指向誤差統計鎖定時間、過衝量與鎖定後的 RMS 誤差。
+
+執行方式 (專案根目錄)：
+    python3 benchmarks/bench_controller.py
+    python3 benchmarks/bench_controller.py --latency 0.15
+"""
+import os
+import sys
+import math
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import config
+from control import AngleHistory, StepController, LatencyCompensatedController, LockMetrics, DEG_PER_PX_X
+
+PHYS_DT = 0.001
+SERVO_SPEED = 300.0 # deg/s，伺服馬達最大轉速
+SERVO_TAU = 0.04    # 秒，一階延遲
+
+SCENARIOS = {
+    # 名稱: (起始偏移角度, 目標角速度 deg/s)
+    "static 20deg": (20.0, 0.0),
+    "static -8deg": (-8.0, 0.0),
+    "moving 10deg/s": (10.0, 10.0),
+    "moving -20deg/s": (-5.0, -20.0),
+}
+
+def simulate(controller_cls, offset, speed, latency, lock_deg, fps=30, duration=3.0, noise_px=1.5, seed=0):
+    rng = np.random.default_rng(seed)
+    history = AngleHistory()
+    controller = controller_cls(history)
+    commanded = physical = config.PAN_CENTER
+    target0 = config.PAN_CENTER + offset
+    history.record(0.0, commanded, config.TILT_LEVEL)
+
+    metrics = LockMetrics(lock_deg, hold=0.3)
+    pending = [] # (可用時間, 拍攝時間, cx)
+    next_frame = 0.0
+    errors = []
+    t = 0.0
+    while t < duration:
+        # 攝影機拍攝：目標相對於「實際」雲台角度的像素位置
+        if t >= next_frame:
+            err_deg = target0 + speed * t - physical
+            cx = config.CX - err_deg / DEG_PER_PX_X + rng.normal(0, noise_px)
+            if 0 <= cx <= config.CX * 2:
+                pending.append((t + latency, t, cx))
+            next_frame += 1.0 / fps
+        # 偵測結果出爐，控制器更新指令角度
+        while pending and pending[0][0] <= t:
+            _, capture_ts, cx = pending.pop(0)
+            d_pan, _, _ = controller.update(cx, config.CY, capture_ts, t, commanded, config.TILT_LEVEL)
+            commanded = max(config.PAN_MIN, min(config.PAN_MAX, commanded + d_pan))
+            history.record(t, commanded, config.TILT_LEVEL)
+        # 伺服馬達追指令：一階延遲 + 轉速上限
+        step = (commanded - physical) * min(1.0, PHYS_DT / SERVO_TAU)
+        step = max(-SERVO_SPEED * PHYS_DT, min(SERVO_SPEED * PHYS_DT, step))
+        physical += step
+
+        true_err = target0 + speed * t - physical
+        if metrics.record(t, true_err, 0.0):
+            errors.append(true_err)
+        t += PHYS_DT
+
+    summary = metrics.summary()
+    ttl = summary.get("time_to_lock")
+    overshoot = metrics.overshoot
+    rms = math.sqrt(sum(e * e for e in errors) / len(errors)) if errors else float("nan")
+    return ttl, overshoot, rms
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.08, help="拍攝到偵測結果可用的延遲 (秒)")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--lock", type=float, default=2.0, help="鎖定門檻 (deg)，預設略大於步進控制的死區")
+    args = parser.parse_args()
+
+    print(f"延遲 {args.latency * 1000:.0f} ms, {args.fps} FPS, 鎖定門檻 {args.lock} deg (持續 0.3 s)")
+    print(f"{'情境':16s} {'控制器':8s} {'鎖定時間':>10s} {'過衝(deg)':>10s} {'鎖定後RMS':>10s}")
+    for name, (offset, speed) in SCENARIOS.items():
+        for label, cls in (("step", StepController), ("pid", LatencyCompensatedController)):
+            ttl, overshoot, rms = simulate(cls, offset, speed, args.latency, args.lock, args.fps)
+            ttl_text = f"{ttl:.2f} s" if ttl is not None else "未鎖定"
+            print(f"{name:16s} {label:8s} {ttl_text:>10s} {overshoot:10.2f} {rms:10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+本地拼音意圖比對的離線準確度與延遲基準
+
+語料為 Vosk 辨識輸出的字串 (benchmarks/intent_corpus.tsv)，
+NONE 表示不該在本地判定，應該交給 Gemini
+
+執行方式 (專案根目錄)：
+    python3 benchmarks/bench_intent_matcher.py
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+import intent_matcher
+from intent_matcher import IntentMatcher
+
+def load_corpus(path):
+    corpus = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'): continue
+            text, expected = line.split('\t')
+            corpus.append((text, None if expected == "NONE" else expected))
+    return corpus
+
+def main():
+    corpus = load_corpus(os.path.join(HERE, "intent_corpus.tsv"))
+    t0 = time.perf_counter()
+    matcher = IntentMatcher()
+    build_ms = (time.perf_counter() - t0) * 1e3
+
+    correct = local = false_pos = missed = 0
+    latencies = []
+    for text, expected in corpus:
+        t0 = time.perf_counter()
+        intent, score, phrase = matcher.best(text)
+        latencies.append((time.perf_counter() - t0) * 1e6)
+        got = intent if score >= matcher.threshold else None
+
+        if got is not None: local += 1
+        if got == expected:
+            correct += 1
+        elif got is None:
+            missed += 1
+            print(f"  MISS   {text:12s} expected {expected:13s} best {intent} ({score:.2f})")
+        else:
+            false_pos += 1
+            print(f"  WRONG  {text:12s} expected {str(expected):13s} got {got} ({score:.2f}, 「{phrase}」)")
+
+    latencies.sort()
+    n = len(corpus)
+    commands = sum(1 for _, e in corpus if e is not None)
+    print(f"pypinyin: {intent_matcher.HAS_PINYIN}   threshold: {matcher.threshold}   index build: {build_ms:.1f} ms")
+    print(f"accuracy        {correct}/{n} ({correct / n:.0%})")
+    print(f"local resolved  {local}/{commands} commands handled without Gemini")
+    print(f"wrong intent    {false_pos}")
+    print(f"fell through    {missed}")
+    print(f"latency         p50 {latencies[n // 2]:.0f} us   p95 {latencies[int(n * 0.95)]:.0f} us   max {latencies[-1]:.0f} us")
+
+if __name__ == "__main__":
+    main()
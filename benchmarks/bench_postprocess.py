@@ -0,0 +1,64 @@
+"""
+SSD 後處理微基準：原本的逐物件 Python 迴圈 vs detection.DetectionPostprocessor
+
+執行方式 (專案根目錄)：
+    python3 benchmarks/bench_postprocess.py
+"""
+import os
+import sys
+import time
+import collections
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from detection import DetectionPostprocessor
+
+# 與 pycoral.adapters.detect 相同的結構
+BBox = collections.namedtuple("BBox", ["xmin", "ymin", "xmax", "ymax"])
+Object = collections.namedtuple("Object", ["id", "score", "bbox"])
+
+FRAME_SHAPE = (480, 640, 3)
+
+def make_outputs(rng, max_det=20, count=20):
+    """模擬 SSD postprocess 的四個輸出張量"""
+    ymin = rng.uniform(0, 0.8, max_det)
+    xmin = rng.uniform(0, 0.8, max_det)
+    boxes = np.stack([ymin, xmin, ymin + 0.2, xmin + 0.2], axis=1).astype(np.float32)
+    class_ids = rng.integers(0, 10, max_det).astype(np.float32)
+    scores = np.sort(rng.uniform(0.2, 1.0, max_det).astype(np.float32))[::-1].copy()
+    return boxes, class_ids, scores, np.float32(count)
+
+def legacy(boxes, class_ids, scores, count):
+    """原本的路徑：get_objects 建立 Object，再逐一縮放 (顯示與目標挑選現在改在追蹤之後處理，不列入比較)"""
+    objs = []
+    for i in range(int(count)):
+        if scores[i] >= 0.5:
+            ymin, xmin, ymax, xmax = boxes[i]
+            objs.append(Object(int(class_ids[i]), float(scores[i]),
+                               BBox(int(xmin * 300), int(ymin * 300), int(xmax * 300), int(ymax * 300))))
+    h, w = FRAME_SHAPE[:2]
+    scaled = []
+    for obj in objs:
+        bbox = obj.bbox
+        scaled.append((int(bbox.xmin*w/300), int(bbox.ymin*h/300), int(bbox.xmax*w/300), int(bbox.ymax*h/300)))
+    return scaled
+
+def bench(fn, cases, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for args in cases:
+            fn(*args)
+    return (time.perf_counter() - t0) / (repeat * len(cases)) * 1e6
+
+def main():
+    rng = np.random.default_rng(0)
+    post = DetectionPostprocessor(threshold=0.5)
+    for count in (5, 20, 100):
+        outs = [make_outputs(rng, max_det=max(count, 20), count=count) for _ in range(50)]
+        new_cases = [o + (FRAME_SHAPE,) for o in outs]
+        t_old = bench(legacy, outs, 40)
+        t_new = bench(post.process, new_cases, 40)
+        print(f"count={count:3d} legacy {t_old:7.1f} us   vectorized {t_new:7.1f} us   x{t_old / t_new:4.1f}")
+
+if __name__ == "__main__":
+    main()
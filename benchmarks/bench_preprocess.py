@@ -0,0 +1,75 @@
+"""
+前處理基準：原本的 cv2.resize + common.set_input vs inference.TensorInput (直接縮放進輸入張量)
+以 tracemalloc 量測每幀新配置的記憶體，並計算耗時
+
+執行方式 (專案根目錄)：
+    python3 benchmarks/bench_preprocess.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from inference import TensorInput
+
+class FakeInterpreter:
+    """模擬 tflite interpreter 的輸入張量介面 (沒有 TPU 也能跑)"""
+    def __init__(self, size):
+        self.buffer = np.zeros((1, size, size, 3), np.uint8)
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': self.buffer.shape}]
+
+    def tensor(self, index):
+        return lambda: self.buffer
+
+def legacy(interpreters, frame):
+    for interp in interpreters:
+        size = interp.buffer.shape[1]
+        resized = cv2.resize(frame, (size, size))
+        # common.set_input: input_tensor(interpreter)[:, :] = data
+        interp.tensor(0)()[0][:, :] = resized
+
+def zero_copy(inputs, frame):
+    for t in inputs:
+        t.load(frame)
+
+def measure(fn, arg, frames, repeat=200):
+    # 暖身
+    fn(arg, frames[0])
+    tracemalloc.start()
+    allocated = 0
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn(arg, frames[i % len(frames)])
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - base
+    elapsed = time.perf_counter() - t0
+    tracemalloc.stop()
+    return elapsed / repeat * 1e3, allocated / repeat
+
+def main():
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(8)]
+    interpreters = [FakeInterpreter(300), FakeInterpreter(192)]
+    inputs = [TensorInput(i) for i in interpreters]
+
+    t_old, b_old = measure(legacy, interpreters, frames)
+    t_new, b_new = measure(zero_copy, inputs, frames)
+    print("SSD 300x300 + MoveNet 192x192 每幀前處理")
+    print(f"  legacy     {t_old:6.3f} ms   allocated {b_old / 1024:8.1f} KiB/frame")
+    print(f"  zero-copy  {t_new:6.3f} ms   allocated {b_new / 1024:8.1f} KiB/frame")
+
+    # 確認結果一致
+    legacy(interpreters, frames[0])
+    expected = [i.buffer.copy() for i in interpreters]
+    zero_copy(inputs, frames[0])
+    assert all(np.array_equal(e, i.buffer) for e, i in zip(expected, interpreters))
+
+if __name__ == "__main__":
+    main()
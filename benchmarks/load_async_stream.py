@@ -0,0 +1,116 @@
+"""
+asyncio 串流伺服器壓力測試：50 個本機觀看者會不會拖慢視覺迴圈
+
+- 同一個行程內跑「合成視覺迴圈」(畫 HUD、模糊、發佈畫面，上限 --fps) 與 AsyncServer
+- 觀看者在另一個行程，用 asyncio 開 N 條 /video_feed 連線持續讀取
+- 比較沒有觀看者 / 有 N 個觀看者時的視覺迴圈 FPS、單圈耗時 p95 與行程執行緒數
+
+執行方式 (專案根目錄)：
+    python3 benchmarks/load_async_stream.py
+    python3 benchmarks/load_async_stream.py --viewers 100 --seconds 10
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import multiprocessing
+import numpy as np
+import cv2
+
+os.environ.setdefault("CONTROL_WS_PORT", "0") # 只測 HTTP 串流
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import config
+from async_server import AsyncServer
+
+def vision_loop(state, fps, stats, stop):
+    """模擬 ai_vision.run_loop 的 CPU 工作量與發佈頻率"""
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (5, 5), 0)
+    interval = 1.0 / fps
+    next_tick = time.monotonic()
+    n = 0
+    while not stop.is_set():
+        t0 = time.monotonic()
+        frame = cv2.GaussianBlur(base, (9, 9), 0)
+        cv2.putText(frame, f"FRAME {n}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        cv2.rectangle(frame, (200 + n % 100, 150), (300 + n % 100, 350), (0, 0, 255), 2)
+        state.frames.publish(frame, t0)
+        stats.append((t0, time.monotonic() - t0))
+        n += 1
+        next_tick += interval
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+
+def viewer_process(port, viewers, seconds, result):
+    async def viewer(counts, i):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /video_feed HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        await writer.drain()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            chunk = await reader.read(65536)
+            if not chunk: break
+            counts[i] += chunk.count(b"--frame")
+        writer.close()
+
+    async def main():
+        counts = [0] * viewers
+        await asyncio.gather(*(viewer(counts, i) for i in range(viewers)))
+        result.extend(counts)
+
+    asyncio.run(main())
+
+def summarize(stats, start, end):
+    window = [cost for t, cost in stats if start <= t < end]
+    if not window: return 0.0, 0.0
+    return len(window) / (end - start), np.percentile(window, 95) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--viewers", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--fps", type=float, default=30.0, help="視覺迴圈上限 (攝影機幀率)")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    state = config.SharedState()
+    server = AsyncServer(state, hardware=None, audio=None)
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(server.serve("127.0.0.1", args.port, ready)), daemon=True).start()
+    ready.wait(5.0)
+
+    stats, stop = [], threading.Event()
+    threading.Thread(target=vision_loop, args=(state, args.fps, stats, stop), daemon=True).start()
+
+    # 1. 沒有觀看者
+    time.sleep(1.0)
+    t0 = time.monotonic()
+    time.sleep(args.seconds)
+    t1 = time.monotonic()
+    idle_threads = threading.active_count()
+
+    # 2. N 個觀看者
+    manager = multiprocessing.Manager()
+    result = manager.list()
+    proc = multiprocessing.Process(target=viewer_process, args=(args.port, args.viewers, args.seconds + 1.0, result))
+    proc.start()
+    time.sleep(1.0) # 等連線建立
+    t2 = time.monotonic()
+    busy_viewers = server.viewers
+    busy_threads = threading.active_count()
+    time.sleep(args.seconds)
+    t3 = time.monotonic()
+    proc.join()
+    stop.set()
+
+    idle_fps, idle_p95 = summarize(stats, t0, t1)
+    busy_fps, busy_p95 = summarize(stats, t2, t3)
+    per_viewer = np.array(result) / (args.seconds + 1.0) if len(result) else np.zeros(1)
+    print(f"視覺迴圈 (上限 {args.fps:.0f} FPS)")
+    print(f"  沒有觀看者      : {idle_fps:5.1f} FPS，單圈 p95 {idle_p95:5.2f} ms，執行緒 {idle_threads}")
+    print(f"  {busy_viewers:3d} 個觀看者    : {busy_fps:5.1f} FPS，單圈 p95 {busy_p95:5.2f} ms，執行緒 {busy_threads}")
+    print(f"觀看者收到的幀率: 平均 {per_viewer.mean():.1f} / 最低 {per_viewer.min():.1f} FPS ({len(result)} 條連線)")
+
+if __name__ == "__main__":
+    main()
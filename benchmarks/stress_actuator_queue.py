@@ -0,0 +1,102 @@
+"""
+致動器佇列壓力測試：同時送出數百個開火請求 (模擬按住空白鍵 + 重複的語音辨識)
+
+- 使用真正的 ActuatorQueue / EngagementScheduler / ActuatorTimeline，只把馬達換成計數器
+- 統計每種結果 (fired / merged / busy / dropped) 的數量與延遲、實際扣扳機次數
+- 比較原本每個請求開一條 threading.Thread(target=fire_gun) 的執行緒數量
+
+執行方式 (專案根目錄)：
+    python3 benchmarks/stress_actuator_queue.py
+    python3 benchmarks/stress_actuator_queue.py --requests 1000 --clients 200
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import collections
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import config
+from actuator import ActuatorTimeline, EngagementScheduler, ActuatorQueue
+
+class CountingHardware:
+    """只記錄扳機動作的硬體替身 (介面與 SentryHardware 相同)"""
+    def __init__(self):
+        self.triggers = 0
+        self.timeline = ActuatorTimeline()
+        self.engagement = EngagementScheduler(self, self.timeline)
+
+    def fire_gun(self):
+        return self.engagement.engage(settle=0.0)
+
+    def manual_move(self, pan_delta, tilt_delta):
+        pass
+
+    def trigger(self, fire):
+        if fire: self.triggers += 1
+
+def run_queue(requests, clients, spread):
+    hardware = CountingHardware()
+    commands = ActuatorQueue(hardware)
+    baseline = threading.active_count()
+    results, peak = [], [0]
+    lock = threading.Lock()
+    start = threading.Barrier(clients)
+
+    def client(n):
+        start.wait()
+        for i in range(n):
+            time.sleep(np.random.uniform(0, spread))
+            # 只計算佇列本身的執行緒，扣掉測試用的 client 執行緒
+            peak[0] = max(peak[0], sum(1 for t in threading.enumerate() if not t.name.startswith("client")))
+            result = commands.fire("client").wait(5.0)
+            with lock: results.append(result)
+
+    per_client = requests // clients
+    threads = [threading.Thread(target=client, args=(per_client,), name=f"client-{i}") for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - t0
+    hardware.engagement.timeline.stop()
+    return results, hardware.triggers, baseline, peak[0], elapsed, commands.stats()
+
+def run_legacy_threads(requests, spread):
+    """原本的作法：每個請求一條執行緒，fire_gun 內 sleep 0.3 秒"""
+    peak = 0
+    def fire_gun():
+        time.sleep(0.3)
+    for _ in range(requests):
+        threading.Thread(target=fire_gun).start()
+        peak = max(peak, threading.active_count())
+        time.sleep(spread / 100)
+    return peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--clients", type=int, default=100, help="同時送出請求的 client 執行緒數")
+    parser.add_argument("--spread", type=float, default=0.5, help="每個 client 兩次請求間的最大間隔 (秒)")
+    args = parser.parse_args()
+
+    results, triggers, baseline, peak, elapsed, stats = run_queue(args.requests, args.clients, args.spread)
+    by_status = collections.defaultdict(list)
+    for r in results:
+        by_status[r["status"] if r else "timeout"].append(r["latency_ms"] if r else float("nan"))
+
+    print(f"請求 {len(results)} 筆 ({args.clients} 個 client，{elapsed:.2f} 秒)，FIRE_DEBOUNCE={config.FIRE_DEBOUNCE}s，佇列上限 {config.ACTUATOR_QUEUE_SIZE}")
+    print(f"{'結果':10s} {'筆數':>6s} {'p50 ms':>8s} {'p99 ms':>8s}")
+    for status, latencies in sorted(by_status.items()):
+        lat = np.array(latencies)
+        print(f"{status:10s} {len(lat):6d} {np.percentile(lat, 50):8.2f} {np.percentile(lat, 99):8.2f}")
+    print(f"實際扣扳機次數: {triggers}")
+    print(f"佇列統計: {stats}")
+    print(f"執行緒數 (不含 client): 開始 {baseline}，峰值 {peak}")
+
+    legacy_peak = run_legacy_threads(min(args.requests, 200), args.spread)
+    print(f"原本每個請求一條執行緒 ({min(args.requests, 200)} 筆)：執行緒峰值 {legacy_peak}")
+
+if __name__ == "__main__":
+    main()
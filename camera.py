@@ -0,0 +1,87 @@
+import time
+import threading
+import collections
+import cv2
+import config
+
+# 一幀影像與其擷取資訊 (monotonic 時間戳 + 遞增序號)
+FramePacket = collections.namedtuple("FramePacket", ["seq", "timestamp", "image"])
+
+class CameraStream:
+    """
+    獨立的攝影機擷取執行緒
+    只保留最新的一幀 (latest-frame slot)，推論迴圈不再等待 I/O，也不會拿到 V4L2 緩衝區裡的舊畫面
+    """
+    def __init__(self, src=config.CAMERA_INDEX, width=640, height=480, reopen_after=config.CAMERA_REOPEN_AFTER):
+        self.src = src
+        self.width = width
+        self.height = height
+        self.reopen_after = reopen_after
+        self.cond = threading.Condition()
+        self.latest = None
+        self.seq = 0
+        self.fail_count = 0
+        self.running = False
+        self.thread = None
+        self.cap = None
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.src)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        # 驅動端只留 1 個緩衝，避免佇列裡堆積舊畫面 (部分後端不支援，忽略即可)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def start(self):
+        if self.running: return self
+        self.running = True
+        self.cap = self._open()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout=2)
+        if self.cap:
+            self.cap.release()
+
+    def _worker(self):
+        while self.running:
+            success, frame = self.cap.read()
+            if not success:
+                self.fail_count += 1
+                if self.fail_count % self.reopen_after == 0:
+                    # 重啟在擷取執行緒內完成，推論迴圈不會被卡住
+                    print(f"⚠️ 攝影機讀取失敗 ({self.fail_count} 次)，嘗試重啟...")
+                    self.cap.release()
+                    time.sleep(1)
+                    self.cap = self._open()
+                else:
+                    time.sleep(0.1)
+                continue
+
+            self.fail_count = 0
+            with self.cond:
+                self.seq += 1
+                # 直接覆蓋舊的一幀 (latest wins)，不排隊
+                self.latest = FramePacket(self.seq, time.monotonic(), frame)
+                self.cond.notify_all()
+
+    def read(self, last_seq=0, timeout=1.0):
+        """
+        取得序號大於 last_seq 的最新一幀，沒有新畫面時最多等待 timeout 秒
+        逾時回傳 None
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.running and (self.latest is None or self.latest.seq <= last_seq):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            return self.latest
@@ -1,5 +1,8 @@
 import os
+import json
+import time
 import threading
+import collections
 
 # 嘗試載入 .env，如果不依賴 python-dotenv，這裡寫個簡單的讀取
 def load_env_file(filepath='.env'):
@@ -14,11 +17,66 @@ load_env_file()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash-latest")
+INTENT_MATCH_THRESHOLD = float(os.getenv("INTENT_MATCH_THRESHOLD", "0.8")) # 本地拼音比對的信心門檻，低於此值才詢問 Gemini
+INTENT_CACHE_PATH = os.getenv("INTENT_CACHE_PATH", "intent_cache.json") # Gemini 意圖快取檔 (空字串則不存檔)
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "256"))
+INTENT_CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", str(7 * 24 * 3600))) # 秒
+GEMINI_PAYLOAD_SCALE = float(os.getenv("GEMINI_PAYLOAD_SCALE", "1.0")) # 送給 Gemini 的圖片縮放比例
+GEMINI_PAYLOAD_QUALITY = int(os.getenv("GEMINI_PAYLOAD_QUALITY", "80")) # JPEG 品質
+GEMINI_PAYLOAD_CROP = float(os.getenv("GEMINI_PAYLOAD_CROP", "1.0")) # 只送準星附近的區域 (畫面比例，1.0 為整張)
+GEMINI_CATCHUP_INTERVAL = float(os.getenv("GEMINI_CATCHUP_INTERVAL", "0.1")) # Gemini 等待期間每隔幾秒暫存一幀
+GEMINI_CATCHUP_FRAMES = int(os.getenv("GEMINI_CATCHUP_FRAMES", "50")) # 最多暫存幾幀 (追趕用，滿了就抽掉一半並把間隔加倍)
 ENABLE_MOVENET = os.getenv("ENABLE_MOVENET", "true").lower() == "true"
 MOVENET_SKIP_FRAMES = int(os.getenv("MOVENET_SKIP_FRAMES", "3"))
+MOVENET_USE_ROI = os.getenv("MOVENET_USE_ROI", "true").lower() == "true" # 只對 SSD 偵測到的人物區域跑 MoveNet
+MOVENET_ROI_PADDING = float(os.getenv("MOVENET_ROI_PADDING", "0.2")) # ROI 四周外擴比例
 SURRENDER_TEXT = os.getenv("SURRENDER_TEXT", "SURRENDER DETECTED!")
 SENTRY_TIMEOUT = int(os.getenv("SENTRY_TIMEOUT", "120"))
 SENTRY_MOVE_THRESHOLD = float(os.getenv("SENTRY_MOVE_THRESHOLD", "2.0"))
+SENTRY_EXPIRE = float(os.getenv("SENTRY_EXPIRE", "3.0")) # 人離開畫面幾秒後刪除他的計時紀錄
+
+# 動態閘控：畫面沒變化時沿用上次的推論結果
+MOTION_GATING = os.getenv("MOTION_GATING", "true").lower() == "true"
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "4.0")) # 縮圖灰階平均差值 (0-255)
+SSD_MAX_STALENESS = float(os.getenv("SSD_MAX_STALENESS", "2.0")) # 秒，靜止畫面下 SSD 最久多久重跑一次
+MOVENET_MAX_STALENESS = float(os.getenv("MOVENET_MAX_STALENESS", "5.0")) # 秒
+SSD_SKIP_FRAMES = int(os.getenv("SSD_SKIP_FRAMES", "1")) # 有動態時 SSD 每 N 幀跑一次，中間由追蹤器預測
+
+# 多目標追蹤 (Kalman + IoU)
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+TRACK_MAX_MISSES = int(os.getenv("TRACK_MAX_MISSES", "5")) # 連續幾次偵測沒對到就刪除
+TRACK_MIN_HITS = int(os.getenv("TRACK_MIN_HITS", "2")) # 對到幾次才算確認的目標
+TRACK_PROCESS_NOISE = float(os.getenv("TRACK_PROCESS_NOISE", "200.0"))
+
+# GEMINI_TRACK 單目標追蹤器 (CSRT / KCF / MOSSE / MIL / auto)
+TRACKER_BACKEND = os.getenv("TRACKER_BACKEND", "auto") # auto: 啟動時自我測試，挑預算內最準的
+TRACKER_BUDGET_MS = float(os.getenv("TRACKER_BUDGET_MS", "15")) # 每幀追蹤的時間預算
+TRACKER_SCALE = float(os.getenv("TRACKER_SCALE", "0.5")) # 在縮小的畫面上追蹤
+
+# GEMINI_TRACK 追丟後的本地重新偵測 (樣板比對)
+REACQUIRE_THRESHOLD = float(os.getenv("REACQUIRE_THRESHOLD", "0.6")) # 樣板比對分數門檻
+REACQUIRE_WINDOW = float(os.getenv("REACQUIRE_WINDOW", "3.0")) # 搜尋視窗為目標框的幾倍
+REACQUIRE_BUDGET_MS = float(os.getenv("REACQUIRE_BUDGET_MS", "30")) # 每幀搜尋的時間預算
+REACQUIRE_MAX_WINDOW = float(os.getenv("REACQUIRE_MAX_WINDOW", "6.0")) # 搜尋視窗放大的上限 (目標框的幾倍)
+REACQUIRE_MAX_PIXELS = int(os.getenv("REACQUIRE_MAX_PIXELS", "40000")) # 搜尋區超過這個像素數就縮小後再比對
+REACQUIRE_TIMEOUT = float(os.getenv("REACQUIRE_TIMEOUT", "1.5")) # 超過幾秒找不回來才重新詢問 Gemini
+
+# 攝影機 (擷取執行緒)
+CAMERA_INDEX = int(os.getenv("CAMERA_INDEX", "0"))
+CAMERA_REOPEN_AFTER = int(os.getenv("CAMERA_REOPEN_AFTER", "10")) # 連續失敗幾次後重開攝影機
+
+# 影像串流
+STREAM_DEFAULT_QUALITY = int(os.getenv("STREAM_DEFAULT_QUALITY", "95")) # 與 OpenCV 預設 JPEG 品質相同
+STREAM_MAX_LATENCY = float(os.getenv("STREAM_MAX_LATENCY", "0.3")) # 自適應模式下單張圖允許的送出時間 (秒)
+
+# 遙測 (SSE /events)
+TELEMETRY_INTERVAL = float(os.getenv("TELEMETRY_INTERVAL", "0.5")) # 秒，FPS / 雲台角度多久檢查一次 (沒變化不推送)
+
+# 網頁伺服器 (flask: 原本的 Flask 開發伺服器；async: asyncio 伺服器，每個觀看者一個 coroutine)
+SERVER_MODE = os.getenv("SERVER_MODE", "flask").lower()
+
+# WebSocket 控制通道 (0 則停用，網頁改用 /cmd)
+CONTROL_WS_PORT = int(os.getenv("CONTROL_WS_PORT", "8765"))
 
 # 檔案路徑
 CORAL_MODEL_PATH = 'model/ssd_mobilenet_v2_coco_quant_postprocess_edgetpu.tflite'
@@ -35,6 +93,15 @@ PAN_MIN, PAN_MAX, PAN_CENTER = 0, 140, 70
 TILT_MIN, TILT_MAX, TILT_LEVEL = 56, 180, 76
 GUN_SAFE, GUN_FIRE = 130, 0
 
+# 馬達寫入執行緒 (I2C)
+SERVO_RESOLUTION = float(os.getenv("SERVO_RESOLUTION", "0.5")) # 度，小於此變化量不寫入
+ENGAGE_SETTLE = float(os.getenv("ENGAGE_SETTLE", "0.5")) # 秒，哨兵瞄準後等馬達到位再開火
+FIRE_HOLD = float(os.getenv("FIRE_HOLD", "0.3")) # 秒，扳機保持在開火位置的時間
+ENGAGE_COOLDOWN = float(os.getenv("ENGAGE_COOLDOWN", "0.2")) # 秒，扳機收回後多久可以再開火
+FIRE_DEBOUNCE = float(os.getenv("FIRE_DEBOUNCE", "0.5")) # 秒，這段時間內重複的開火請求合併成一次
+ACTUATOR_QUEUE_SIZE = int(os.getenv("ACTUATOR_QUEUE_SIZE", "16")) # 致動器指令佇列上限，滿了直接拒絕
+SERVO_MAX_RATE = float(os.getenv("SERVO_MAX_RATE", "50")) # 每秒最多寫入幾次 (伺服馬達 PWM 為 50Hz)
+
 # PID 參數 (修正：垂直方向改回正值，但降低數值以求穩定)
 KP_PAN = 0.025  # 微調
 KP_TILT = 0.025 # 改回正值，因為負值會導致正回授 (看天花板)
@@ -46,13 +113,149 @@ DEADBAND = 20   # 保持 20
 # 畫面中心
 CX, CY = 320, 240
 
+# 延遲補償追蹤控制器 (TRACK_CONTROLLER=step 則使用上面的比例步進控制)
+TRACK_CONTROLLER = os.getenv("TRACK_CONTROLLER", "pid").lower() # pid / step
+CAMERA_HFOV = float(os.getenv("CAMERA_HFOV", "60")) # 攝影機水平視角 (度)，像素誤差換算角度用
+CAMERA_VFOV = float(os.getenv("CAMERA_VFOV", "45")) # 垂直視角 (度)
+CONTROL_KP = float(os.getenv("CONTROL_KP", "6.0")) # 每度誤差給多少 deg/s
+CONTROL_KI = float(os.getenv("CONTROL_KI", "0.5"))
+CONTROL_KD = float(os.getenv("CONTROL_KD", "0.05"))
+CONTROL_I_LIMIT = float(os.getenv("CONTROL_I_LIMIT", "5.0")) # 積分上限 (度·秒)
+CONTROL_MAX_SPEED = float(os.getenv("CONTROL_MAX_SPEED", "120")) # 雲台最大角速度 (deg/s)
+CONTROL_LOCK_DEG = float(os.getenv("CONTROL_LOCK_DEG", "1.0")) # 誤差小於幾度算鎖定
+SERVO_LAG = float(os.getenv("SERVO_LAG", "0.05")) # 秒，指令送出到馬達實際轉到的延遲 (查詢拍攝時角度用)
+CONTROL_VELOCITY_ALPHA = float(os.getenv("CONTROL_VELOCITY_ALPHA", "0.4")) # 目標角速度估計的平滑係數
+
+class FrameExchange:
+    """
+    版本化的畫面交換區 (取代 output_frame + lock + copy)
+    生產者以參考替換整個 buffer，消費者拿到唯讀快照，不需要複製
+    """
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.version = 0
+        self.frame = None
+        self.timestamp = 0.0
+
+    def publish(self, frame, timestamp=None):
+        # 發佈後這塊 buffer 就屬於消費者，設為唯讀避免生產者再畫上去
+        frame.setflags(write=False)
+        with self.cond:
+            self.frame = frame
+            self.timestamp = timestamp if timestamp is not None else time.monotonic()
+            self.version += 1
+            self.cond.notify_all()
+
+    def snapshot(self):
+        """回傳 (version, frame)，frame 為唯讀，可能為 None"""
+        with self.cond:
+            return self.version, self.frame
+
+    def wait_newer(self, last_version, timeout=1.0):
+        """
+        阻塞直到出現比 last_version 新的畫面
+        逾時回傳目前的 (version, frame)，呼叫端比對 version 即可知道有沒有更新
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.version > last_version, timeout)
+            return self.version, self.frame
+
+class EventLog:
+    """
+    遞增序號的遙測事件 (SSE /events 用)
+    - 事件在發佈時序列化一次，所有客戶端共用同一份字串
+    - 只保留最近 maxlen 筆；斷線重連的客戶端從 Last-Event-ID 之後續傳
+    - 沒有新事件時讀取端阻塞在 Condition 上，不做任何事
+    """
+    def __init__(self, maxlen=256):
+        self.cond = threading.Condition()
+        self.events = collections.deque(maxlen=maxlen) # (seq, kind, payload)
+        self.latest = {} # kind -> 最後一次的資料 (快照用)
+        self.seq = 0
+
+    def publish(self, kind, data):
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        with self.cond:
+            self.seq += 1
+            self.events.append((self.seq, kind, payload))
+            self.latest[kind] = data
+            self.cond.notify_all()
+            return self.seq
+
+    def since(self, last_id):
+        """回傳 (last_id 之後的事件, 是否完整)；中間的事件已被擠掉時 complete 為 False"""
+        with self.cond:
+            return self._since(last_id)
+
+    def wait(self, last_id, timeout=15.0):
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > last_id, timeout)
+            return self._since(last_id)
+
+    def _since(self, last_id):
+        # last_id 比目前序號還大 (伺服器重啟過) 也視為不完整
+        complete = last_id <= self.seq and (not self.events or self.events[0][0] <= last_id + 1)
+        return [e for e in self.events if e[0] > last_id], complete
+
 class SharedState:
     def __init__(self):
         self.lock = threading.Lock()
-        self.current_mode = "IDLE"  # IDLE, CORAL_TRACK, GEMINI_SEARCH, GEMINI_TRACK
+        self.events = EventLog() # 推送給網頁的遙測事件
+        self._mode = "IDLE"  # IDLE, CORAL_TRACK, GEMINI_SEARCH, GEMINI_TRACK
         self.target_config = {"id": 0, "name": "person"}
         self.gemini_prompt = ""
         self.auto_fire_enabled = False
-        self.output_frame = None
+        self.frames = FrameExchange() # 輸出畫面 (不再使用 lock 保護)
         self.running = True # 控制程式結束
         self.voice_logs = [] # 儲存語音紀錄
+        self.stats_sources = {} # 名稱 -> 回傳統計 dict 的函式，只在 /stats 或遙測快照時才呼叫
+
+    @property
+    def current_mode(self):
+        return self._mode
+
+    @current_mode.setter
+    def current_mode(self, mode):
+        # 模式一改變就推送，網頁顯示的模式不會和實際狀態不同步
+        if mode != self._mode:
+            self._mode = mode
+            self.events.publish("mode", {"mode": mode})
+
+    def add_voice_log(self, text):
+        # 記錄到共享狀態，保留最近 10 筆
+        with self.lock:
+            self.voice_logs.append(text)
+            if len(self.voice_logs) > 10:
+                self.voice_logs.pop(0)
+        self.events.publish("voice", {"text": text})
+
+    def register_stats(self, name, fn):
+        """登記子系統的統計 (推論排程、追蹤器、控制器…)，各子系統不必每幀更新共享狀態"""
+        self.stats_sources[name] = fn
+
+    def stats_snapshot(self):
+        stats = {}
+        for name, fn in list(self.stats_sources.items()):
+            try:
+                stats[name] = fn()
+            except Exception as e:
+                stats[name] = {"error": str(e)}
+        return stats
+
+    def telemetry_snapshot(self):
+        """回傳 (seq, 完整狀態)，新連線或落後太多的 SSE 客戶端先收到這份"""
+        with self.events.cond:
+            seq = self.events.seq
+            latest = dict(self.events.latest)
+        return seq, {
+            "mode": self.current_mode,
+            "voice_logs": list(self.voice_logs),
+            "status": latest.get("status"),
+            "sentry": latest.get("sentry"),
+            "stats": self.stats_snapshot(),
+        }
+
+    @property
+    def output_frame(self):
+        # 相容舊程式：回傳最新一幀 (唯讀)
+        return self.frames.frame
@@ -0,0 +1,191 @@
+import threading
+import collections
+import config
+
+DEG_PER_PX_X = config.CAMERA_HFOV / (config.CX * 2)
+DEG_PER_PX_Y = config.CAMERA_VFOV / (config.CY * 2)
+
+class AngleHistory:
+    """
+    最近一段時間的雲台指令角度 (時間, pan, tilt)
+    用來查詢「拍下這一幀時」雲台在哪裡，扣掉之後自己轉動造成的畫面位移
+    """
+    def __init__(self, horizon=1.0):
+        self.horizon = horizon
+        self.lock = threading.Lock()
+        self.samples = collections.deque()
+
+    def record(self, t, pan, tilt):
+        with self.lock:
+            self.samples.append((t, pan, tilt))
+            while len(self.samples) > 2 and t - self.samples[0][0] > self.horizon:
+                self.samples.popleft()
+
+    def at(self, t):
+        """時間 t 的角度 (線性內插；超出範圍取最近的一筆)"""
+        with self.lock:
+            if not self.samples: return None
+            prev = self.samples[0]
+            if t <= prev[0]: return prev[1], prev[2]
+            for sample in self.samples:
+                if sample[0] >= t:
+                    span = sample[0] - prev[0]
+                    k = (t - prev[0]) / span if span > 0 else 1.0
+                    return prev[1] + (sample[1] - prev[1]) * k, prev[2] + (sample[2] - prev[2]) * k
+                prev = sample
+            return prev[1], prev[2]
+
+class PID:
+    """
+    單軸 PID (輸出為角速度 deg/s)
+    - 微分項取誤差的變化，並做一階低通
+    - Anti-windup：輸出飽和且誤差同向時不再累積積分，積分本身也有上限
+    """
+    def __init__(self, kp, ki, kd, out_limit, i_limit):
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.out_limit = out_limit
+        self.i_limit = i_limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.prev_error = None
+        self.d_filtered = 0.0
+
+    def step(self, error, dt, feedforward=0.0):
+        if dt <= 0: dt = 1e-3
+        if self.prev_error is not None:
+            d = (error - self.prev_error) / dt
+            self.d_filtered += 0.5 * (d - self.d_filtered)
+        self.prev_error = error
+
+        integral = max(-self.i_limit, min(self.i_limit, self.integral + error * dt))
+        out = self.kp * error + self.ki * integral + self.kd * self.d_filtered + feedforward
+        clamped = max(-self.out_limit, min(self.out_limit, out))
+        # 條件積分：沒飽和，或飽和但誤差往反方向拉時才更新
+        if clamped == out or (out > 0) != (error > 0):
+            self.integral = integral
+        return clamped
+
+class LockMetrics:
+    """
+    鎖定品質統計：每次出現新目標後的鎖定時間 (誤差持續小於門檻 hold 秒) 與過衝量
+    """
+    def __init__(self, threshold=config.CONTROL_LOCK_DEG, hold=0.2):
+        self.threshold = threshold
+        self.hold = hold
+        self.results = collections.deque(maxlen=50) # (time_to_lock, overshoot)
+        self.reset()
+
+    def reset(self):
+        self.start = None
+        self.initial_sign = 0
+        self.overshoot = 0.0
+        self.inside_since = None
+        self.locked_at = None
+
+    def record(self, now, err_pan, err_tilt):
+        err = max(abs(err_pan), abs(err_tilt))
+        if self.start is None:
+            self.start = now
+            self.initial_sign = 1 if err_pan >= 0 else -1
+        # 主要看水平軸：誤差越過零點後往反方向的最大值
+        if err_pan * self.initial_sign < 0:
+            self.overshoot = max(self.overshoot, abs(err_pan))
+        if self.locked_at is not None: return True
+        if err < self.threshold:
+            if self.inside_since is None: self.inside_since = now
+            if now - self.inside_since >= self.hold:
+                self.locked_at = now
+                self.results.append((self.inside_since - self.start, self.overshoot))
+                return True
+        else:
+            self.inside_since = None
+        return False
+
+    def summary(self):
+        if not self.results: return {"locks": 0}
+        ttl = [r[0] for r in self.results]
+        over = [r[1] for r in self.results]
+        return {
+            "locks": len(self.results),
+            "time_to_lock": round(sum(ttl) / len(ttl), 3),
+            "overshoot_deg": round(sum(over) / len(over), 2),
+        }
+
+class StepController:
+    """原本的比例步進控制 (像素誤差 * KP，限制單步與死區)，保留作為比較基準"""
+    def __init__(self, history=None):
+        self.history = history
+
+    def reset(self):
+        pass
+
+    def update(self, cx, cy, capture_ts, now, pan, tilt):
+        err_x = config.CX - cx
+        err_y = config.CY - cy
+        if abs(err_x) < config.DEADBAND: err_x = 0
+        if abs(err_y) < config.DEADBAND: err_y = 0
+        delta_pan = max(min(err_x * config.KP_PAN, config.MAX_STEP), -config.MAX_STEP)
+        delta_tilt = max(min(err_y * config.KP_TILT, config.MAX_STEP), -config.MAX_STEP)
+        locked = abs(err_x) < (config.DEADBAND - 10) and abs(err_y) < (config.DEADBAND - 10)
+        return delta_pan, delta_tilt, locked
+
+class LatencyCompensatedController:
+    """
+    延遲補償的追蹤控制器
+    1. 用拍攝時間查 AngleHistory，把像素誤差換成目標的「絕對角度」(扣掉拍攝後雲台自己的轉動)
+    2. 由連續幾次的絕對角度估計目標角速度，外推到現在
+    3. 對「外推位置 - 目前角度」做 PID，角速度當前饋
+    """
+    def __init__(self, history, gap=0.5):
+        self.history = history
+        self.gap = gap # 超過幾秒沒有量測就視為新目標
+        self.pan_pid = PID(config.CONTROL_KP, config.CONTROL_KI, config.CONTROL_KD, config.CONTROL_MAX_SPEED, config.CONTROL_I_LIMIT)
+        self.tilt_pid = PID(config.CONTROL_KP, config.CONTROL_KI, config.CONTROL_KD, config.CONTROL_MAX_SPEED, config.CONTROL_I_LIMIT)
+        self.metrics = LockMetrics()
+        self.reset()
+
+    def reset(self):
+        self.pan_pid.reset()
+        self.tilt_pid.reset()
+        self.metrics.reset()
+        self.last_obs = None # (capture_ts, target_pan, target_tilt)
+        self.velocity = (0.0, 0.0)
+        self.last_update = None
+
+    def update(self, cx, cy, capture_ts, now, pan, tilt):
+        if self.last_update is not None and now - self.last_update > self.gap:
+            self.reset()
+        dt = now - self.last_update if self.last_update is not None else 1.0 / 30
+        self.last_update = now
+
+        # 拍攝當下的雲台角度 + 像素誤差 = 目標的絕對角度
+        # 指令角度到馬達實際轉到有一段延遲，查詢時往前推
+        at_capture = self.history.at(capture_ts - config.SERVO_LAG) if self.history else None
+        cap_pan, cap_tilt = at_capture if at_capture else (pan, tilt)
+        target_pan = cap_pan + (config.CX - cx) * DEG_PER_PX_X
+        target_tilt = cap_tilt + (config.CY - cy) * DEG_PER_PX_Y
+
+        if self.last_obs and capture_ts > self.last_obs[0]:
+            span = capture_ts - self.last_obs[0]
+            vx = (target_pan - self.last_obs[1]) / span
+            vy = (target_tilt - self.last_obs[2]) / span
+            a = config.CONTROL_VELOCITY_ALPHA
+            self.velocity = (self.velocity[0] + a * (vx - self.velocity[0]), self.velocity[1] + a * (vy - self.velocity[1]))
+        self.last_obs = (capture_ts, target_pan, target_tilt)
+
+        # 外推到現在 (補償偵測延遲)
+        lag = now - capture_ts
+        err_pan = target_pan + self.velocity[0] * lag - pan
+        err_tilt = target_tilt + self.velocity[1] * lag - tilt
+
+        speed_pan = self.pan_pid.step(err_pan, dt, self.velocity[0])
+        speed_tilt = self.tilt_pid.step(err_tilt, dt, self.velocity[1])
+        locked = self.metrics.record(now, err_pan, err_tilt) and max(abs(err_pan), abs(err_tilt)) < self.metrics.threshold
+        return speed_pan * dt, speed_tilt * dt, locked
+
+def create_controller(history):
+    if config.TRACK_CONTROLLER == "step":
+        return StepController(history)
+    return LatencyCompensatedController(history)
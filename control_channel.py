@@ -0,0 +1,140 @@
+import json
+import threading
+import config
+
+# 嘗試匯入 websockets (同步版 server，每個連線一條執行緒)
+try:
+    from websockets.sync.server import serve
+    from websockets.exceptions import ConnectionClosed
+    HAS_WEBSOCKETS = True
+except ImportError:
+    print("⚠️ 未安裝 websockets，WebSocket 控制通道停用 (網頁改用 /cmd)")
+    HAS_WEBSOCKETS = False
+
+MOVE_STEP = 5 # Small step for smooth continuous movement
+MOVES = {"left": (MOVE_STEP, 0), "right": (-MOVE_STEP, 0), "up": (0, MOVE_STEP), "down": (0, -MOVE_STEP)}
+
+def apply_command(state, hardware, audio, mode, val=None, axis=None, source="web"):
+    """
+    執行一筆手動控制指令 (/cmd 與 WebSocket 共用)
+    開火回傳 ActuatorRequest，其他回傳 None
+    """
+    if mode == 'fire':
+        return hardware.commands.fire(source)
+
+    elif mode == 'mode':
+        state.current_mode = val
+        audio.mode_switched(val) # 播放模式切換語音
+        if val == 'CORAL_TRACK':
+            state.target_config = {"id": 0, "name": "person"}
+
+    elif mode == 'set_angle':
+        state.current_mode = "IDLE"
+        try:
+            angle = float(val)
+            if axis == 'pan':
+                hardware.set_angles(pan=angle, tilt=None)
+            elif axis == 'tilt':
+                hardware.set_angles(pan=None, tilt=angle)
+        except (TypeError, ValueError):
+            pass
+
+    elif mode == 'move':
+        # Manual control overrides current mode to IDLE
+        state.current_mode = "IDLE"
+        pan_d, tilt_d = MOVES.get(val, (0, 0))
+        hardware.manual_move(pan_d, tilt_d)
+
+class ControlChannel:
+    """
+    WebSocket 手動控制通道 (move / set_angle / fire / mode)
+    - 一條持續的連線取代每次按鍵、每次拖動拉桿的 HTTP 請求
+    - 已經到達的訊息一次取出合併：拉桿取最新角度、移動量累加、模式取最後一個
+    - 每批處理完回覆 ack (套用後的角度與模式)，網頁用來量測來回延遲
+    """
+    def __init__(self, state, hardware, audio, host="0.0.0.0", port=config.CONTROL_WS_PORT):
+        self.state = state
+        self.hardware = hardware
+        self.audio = audio
+        self.host = host
+        self.port = port
+        self.server = None
+        self.counters = {"messages": 0, "batches": 0}
+
+    def start(self):
+        if not HAS_WEBSOCKETS or not self.port: return False
+        try:
+            self.server = serve(self._handle, self.host, self.port)
+        except OSError as e:
+            print(f"❌ WebSocket 控制通道啟動失敗: {e}")
+            return False
+        threading.Thread(target=self.server.serve_forever, name="control-ws", daemon=True).start()
+        print(f"✅ WebSocket 控制通道: ws://{self.host}:{self.port}")
+        return True
+
+    def stop(self):
+        if self.server: self.server.shutdown()
+
+    def _handle(self, websocket):
+        try:
+            while True:
+                batch = [websocket.recv()]
+                # 把已經到達的訊息一起取出，合併成最新值
+                while True:
+                    try:
+                        batch.append(websocket.recv(timeout=0))
+                    except TimeoutError:
+                        break
+                websocket.send(json.dumps(self.apply_batch(batch)))
+        except ConnectionClosed:
+            pass
+
+    def apply_batch(self, batch):
+        """合併並套用一批訊息 (原始 JSON 字串)，回傳 ack"""
+        ids, angles, mode = [], {}, None
+        pan_d = tilt_d = 0
+        fire = manual = False
+        for raw in batch:
+            try:
+                msg = json.loads(raw)
+                cmd = msg.get("cmd")
+            except (ValueError, AttributeError):
+                continue
+            if msg.get("id") is not None: ids.append(msg["id"])
+            if cmd == "set_angle":
+                angles[msg.get("axis")] = msg.get("val")
+                manual, mode = True, None # 手動操作會切回 IDLE，之前的模式指令作廢
+            elif cmd == "move":
+                d = MOVES.get(msg.get("val"), (0, 0))
+                pan_d, tilt_d = pan_d + d[0], tilt_d + d[1]
+                manual, mode = True, None
+            elif cmd == "mode":
+                mode = msg.get("val")
+            elif cmd == "fire":
+                fire = True
+
+        self.counters["messages"] += len(batch)
+        self.counters["batches"] += 1
+
+        if manual:
+            for axis, val in angles.items():
+                apply_command(self.state, self.hardware, self.audio, 'set_angle', val, axis)
+            if pan_d or tilt_d:
+                self.state.current_mode = "IDLE"
+                self.hardware.manual_move(pan_d, tilt_d)
+        if mode:
+            apply_command(self.state, self.hardware, self.audio, 'mode', mode)
+        fire_result = None
+        if fire:
+            fire_result = apply_command(self.state, self.hardware, self.audio, 'fire', source="ws").wait(1.0)
+
+        return {
+            "type": "ack",
+            "ids": ids,
+            "last_id": ids[-1] if ids else None,
+            "coalesced": len(batch),
+            "pan": round(self.hardware.pan_angle, 1),
+            "tilt": round(self.hardware.tilt_angle, 1),
+            "mode": self.state.current_mode,
+            "fire": fire_result,
+        }
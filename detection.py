@@ -0,0 +1,77 @@
+import collections
+import numpy as np
+
+PERSON_ID = 0
+
+# 後處理結果：每個欄位都是陣列，不再為每個物件建立 Python 物件
+# boxes: (N, 4) int32，畫面座標 [xmin, ymin, xmax, ymax]
+# 顯示與目標挑選在追蹤之後處理 (visible_mask / target_class)
+Detections = collections.namedtuple("Detections", ["boxes", "class_ids", "scores"])
+
+EMPTY_DETECTIONS = Detections(np.zeros((0, 4), np.int32), np.zeros(0, np.int32), np.zeros(0, np.float32))
+
+def person_roi(box, frame_shape, padding=0.2):
+    """
+    依人物框算出給 MoveNet 用的正方形 ROI (MoveNet 輸入為正方形，避免變形)
+    box: (xmin, ymin, xmax, ymax) 像素座標
+    回傳 (x0, y0, side)，已限制在畫面內
+    """
+    h, w = frame_shape[:2]
+    xmin, ymin, xmax, ymax = box
+    side = int(max(xmax - xmin, ymax - ymin) * (1 + padding * 2))
+    side = max(1, min(side, h, w))
+    cx, cy = (xmin + xmax) // 2, (ymin + ymax) // 2
+    # 貼邊時往內平移，而不是裁掉變成長方形
+    x0 = min(max(cx - side // 2, 0), w - side)
+    y0 = min(max(cy - side // 2, 0), h - side)
+    return x0, y0, side
+
+class DetectionPostprocessor:
+    """
+    SSD 輸出的向量化後處理
+    直接讀取 boxes / classes / scores / count 四個輸出張量，
+    一次完成分數門檻與座標縮放；模式顯示遮罩與目標類別給追蹤後的結果使用
+    """
+    def __init__(self, num_classes=91, threshold=0.5):
+        self.num_classes = num_classes
+        self.threshold = threshold
+        # 預先算好每個模式的類別遮罩：IDLE / SENTRY 只顯示人
+        person_only = np.zeros(num_classes, bool)
+        person_only[PERSON_ID] = True
+        self.default_mask = np.ones(num_classes, bool)
+        self.mode_masks = {"IDLE": person_only, "SENTRY_MODE": person_only}
+        self._scale_shape = None
+        self._scale = None
+
+    def visible_mask(self, mode):
+        """該模式下各類別是否顯示 (bool 陣列，以 class id 索引)"""
+        return self.mode_masks.get(mode, self.default_mask)
+
+    def target_class(self, mode, target_id):
+        if mode == "CORAL_TRACK": return target_id
+        if mode == "SENTRY_MODE": return PERSON_ID
+        return None
+
+    def process(self, boxes, class_ids, scores, count, frame_shape):
+        """
+        boxes: (M, 4) 正規化 [ymin, xmin, ymax, xmax]
+        class_ids / scores: (M,)
+        count: 有效偵測數
+        """
+        count = int(count)
+        scores = scores[:count]
+        keep = scores >= self.threshold
+        if not keep.any():
+            return EMPTY_DETECTIONS
+
+        scores = scores[keep]
+        class_ids = class_ids[:count][keep].astype(np.int32)
+        np.clip(class_ids, 0, self.num_classes - 1, out=class_ids)
+
+        # [ymin, xmin, ymax, xmax] (0-1) -> [xmin, ymin, xmax, ymax] (像素)，一次完成
+        if self._scale_shape != frame_shape[:2]:
+            h, w = frame_shape[:2]
+            self._scale_shape = frame_shape[:2]
+            self._scale = np.array([w, h, w, h], np.float32)
+        scaled = (boxes[:count][keep][:, [1, 0, 3, 2]] * self._scale).astype(np.int32)
+        return Detections(scaled, class_ids, scores)
@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import time
+import threading
+import collections
+import concurrent.futures
+import cv2
+import config
+
+class GeminiSearch:
+    """
+    非阻塞的 Gemini 視覺搜尋
+    - 請求丟到背景執行緒，視覺迴圈照常擷取、偵測、串流
+    - 請求會附上送出當下的畫面與時間戳；等待期間把之後的畫面 (抽樣) 暫存起來，
+      結果回來後追蹤器先在請求那一幀初始化，再用暫存的畫面追到現在
+    - 搜尋目標改變時，新的請求立刻在另一條執行緒送出；還在等待的舊請求跑完後結果直接丟掉
+    """
+    def __init__(self, ask_fn, buffer_interval=config.GEMINI_CATCHUP_INTERVAL, buffer_size=config.GEMINI_CATCHUP_FRAMES):
+        self.ask_fn = ask_fn # ask_fn(frame, prompt) -> bbox (x, y, w, h) 或 None
+        self.buffer_interval = buffer_interval
+        self.buffer_size = buffer_size
+        self.frames = []
+        self.interval = buffer_interval # 暫存滿了會加倍
+        self.future = None
+        self.prompt = None
+        self.request_frame = None
+        self.request_time = 0.0
+        self.last_buffered = 0.0
+
+    def pending(self):
+        return self.future is not None
+
+    def elapsed(self):
+        return time.monotonic() - self.request_time if self.future else 0.0
+
+    def submit(self, frame, timestamp, prompt):
+        """frame 必須是還沒畫上 HUD 的乾淨畫面，送出後不可再修改"""
+        self.cancel()
+        self.prompt = prompt
+        self.request_frame = frame
+        self.request_time = timestamp
+        self.last_buffered = timestamp
+        self.future = self._start(frame, prompt)
+        print(f"🧠 Gemini 搜尋請求送出: [{prompt}]")
+
+    def _start(self, frame, prompt):
+        # 每個請求一條執行緒：HTTP 請求無法中途取消，共用一條 worker 的話新目標要排在舊請求後面
+        future = concurrent.futures.Future()
+        def run():
+            if not future.set_running_or_notify_cancel(): return
+            try:
+                future.set_result(self.ask_fn(frame, prompt))
+            except Exception as e:
+                future.set_exception(e)
+        threading.Thread(target=run, name="gemini", daemon=True).start()
+        return future
+
+    def cancel(self):
+        # 已經在跑的請求讓它跑完，但 future 不再被 poll，結果不會被採用
+        self.future = None
+        self.request_frame = None
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self.frames = []
+        self.interval = self.buffer_interval
+
+    def buffer(self, frame, timestamp):
+        """等待期間呼叫，依間隔抽樣保存畫面，追趕時使用"""
+        if self.future is None: return
+        if timestamp - self.last_buffered >= self.interval:
+            if len(self.frames) >= self.buffer_size:
+                # 滿了就隔一張丟一張並把間隔加倍：保留請求之後的早期畫面，追蹤器才不會一次跳好幾秒
+                self.frames = self.frames[::2]
+                self.interval *= 2
+            self.frames.append(frame)
+            self.last_buffered = timestamp
+
+    def poll(self):
+        """
+        還沒完成回傳 None
+        完成後回傳 (bbox, request_frame, buffered_frames)，bbox 可能為 None (找不到)
+        """
+        if self.future is None or not self.future.done():
+            return None
+        try:
+            bbox = self.future.result()
+        except Exception as e:
+            print(f"Gemini Error: {e}")
+            bbox = None
+        result = (bbox, self.request_frame, self.frames)
+        print(f"🧠 Gemini 回應 ({time.monotonic() - self.request_time:.2f}s): {bbox}")
+        self.cancel()
+        return result
+
+class IntentCache:
+    """
+    Gemini 意圖結果的 LRU + TTL 快取，並存成精簡的 JSON 檔，重開機後仍然有效
+    key 為正規化後的辨識文字 (同一句誤聽的話一天會出現很多次)
+    """
+    def __init__(self, path=config.INTENT_CACHE_PATH, max_size=config.INTENT_CACHE_SIZE, ttl=config.INTENT_CACHE_TTL):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict() # key -> (intent_data, 寫入時間)
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @staticmethod
+    def normalize(text):
+        # 去掉空白與標點，英文轉小寫
+        return re.sub(r"[\s\W_]+", "", text).lower()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                now = time.time()
+                for key, data, stamp in json.load(f):
+                    if now - stamp < self.ttl:
+                        self.entries[key] = (data, stamp)
+            print(f"🗂️ 意圖快取載入 {len(self.entries)} 筆")
+        except Exception as e:
+            print(f"⚠️ 意圖快取讀取失敗: {e}")
+
+    def _save(self):
+        if not self.path: return
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump([[k, d, t] for k, (d, t) in self.entries.items()], f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp, self.path) # 原子替換，寫到一半斷電也不會壞掉
+        except Exception as e:
+            print(f"⚠️ 意圖快取寫入失敗: {e}")
+
+    def get(self, text):
+        key = self.normalize(text)
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None and time.time() - item[1] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self.entries[key] # 過期
+            self.misses += 1
+            return None
+
+    def put(self, text, intent_data):
+        key = self.normalize(text)
+        if not key or intent_data is None: return
+        with self.lock:
+            self.entries[key] = (intent_data, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self._save()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries),
+                    "hit_rate": self.hits / total if total else 0.0}
+
+class PayloadShaper:
+    """
+    Gemini 圖片請求的酬載整形
+    - 使用還沒畫 HUD 的乾淨畫面
+    - 可裁切到準星 (伺服馬達正前方) 附近的關注區域、縮小、指定 JPEG 品質
+    - 回傳座標換算回整張畫面的像素
+    - 記錄每次請求的大小與往返時間，用來找出仍能準確定位的最小酬載
+    """
+    def __init__(self, scale=config.GEMINI_PAYLOAD_SCALE, quality=config.GEMINI_PAYLOAD_QUALITY, crop=config.GEMINI_PAYLOAD_CROP):
+        self.scale = scale
+        self.quality = quality
+        self.crop = crop # 保留畫面寬高的比例，1.0 表示不裁切
+        self.history = collections.deque(maxlen=100) # (bytes, 往返秒數, 是否找到)
+
+    def encode(self, frame):
+        """回傳 (jpeg bytes, transform)，transform 用於把結果換算回整張畫面"""
+        h, w = frame.shape[:2]
+        x0, y0, cw, ch = 0, 0, w, h
+        if self.crop < 1.0:
+            cw, ch = int(w * self.crop), int(h * self.crop)
+            # 以準星為中心，貼邊時往內移
+            x0 = min(max(config.CX - cw // 2, 0), w - cw)
+            y0 = min(max(config.CY - ch // 2, 0), h - ch)
+        image = frame[y0:y0+ch, x0:x0+cw]
+        if self.scale != 1.0:
+            image = cv2.resize(image, (max(1, int(cw * self.scale)), max(1, int(ch * self.scale))), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        return buffer.tobytes(), (x0, y0, cw, ch)
+
+    def to_frame(self, box_2d, transform):
+        """Gemini 的 [ymin, xmin, ymax, xmax] (0-1000，相對於送出的圖) -> 整張畫面的 (x, y, w, h)"""
+        x0, y0, cw, ch = transform
+        ymin, xmin, ymax, xmax = box_2d
+        return (int(x0 + xmin/1000*cw), int(y0 + ymin/1000*ch), int((xmax-xmin)/1000*cw), int((ymax-ymin)/1000*ch))
+
+    def record(self, size, rtt, found):
+        self.history.append((size, rtt, found))
+        print(f"📦 Gemini 酬載 {size / 1024:.1f} KiB, 往返 {rtt:.2f}s, {'找到' if found else '未找到'}")
+
+    def stats(self):
+        history = tuple(self.history) # 網頁執行緒呼叫時，Gemini 執行緒可能正在 append
+        if not history: return {}
+        n = len(history)
+        return {
+            "requests": n,
+            "avg_kib": sum(h[0] for h in history) / n / 1024,
+            "avg_rtt": sum(h[1] for h in history) / n,
+            "found_rate": sum(1 for h in history if h[2]) / n,
+        }
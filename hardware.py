@@ -3,6 +3,8 @@ import threading
 import os
 from adafruit_servokit import ServoKit
 import config
+from actuator import ServoWriter, ActuatorTimeline, EngagementScheduler, ActuatorQueue
+from control import AngleHistory, create_controller
 
 # 嘗試匯入 pygame 用於音效播放
 try:
@@ -19,6 +21,15 @@ class SentryHardware:
         self.pan_angle = config.PAN_CENTER
         self.tilt_angle = config.TILT_LEVEL
         self.kit = None
+        self.writer = None # 所有馬達寫入都交給專屬執行緒
+        self.angle_history = AngleHistory() # 指令角度紀錄 (延遲補償用)
+        self.controller = create_controller(self.angle_history)
+        metrics = getattr(self.controller, "metrics", None)
+        if metrics:
+            state.register_stats("control", metrics.summary)
+        self.timeline = ActuatorTimeline() # 開火等需要等待的動作都排在這裡，不在呼叫端 sleep
+        self.engagement = EngagementScheduler(self, self.timeline)
+        self.commands = ActuatorQueue(self) # 網頁 / 語音的開火請求 (合併重複請求，固定一條執行緒)
         self.fire_sound = None
         
         # 初始化音效
@@ -31,28 +42,39 @@ class SentryHardware:
         
         try:
             self.kit = ServoKit(channels=16)
+            self.writer = ServoWriter(self.kit)
             self.reset_servos()
             print("✅ 馬達板: 連線成功")
         except:
             print("⚠️ 馬達板未連接 (模擬模式)")
 
     def reset_servos(self):
-        if self.kit:
-            self.kit.servo[config.PAN_CH].angle = self.pan_angle
-            self.kit.servo[config.TILT_CH].angle = self.tilt_angle
-            self.kit.servo[config.GUN_CH].angle = config.GUN_SAFE
+        if self.writer:
+            self.writer.set_many({
+                config.PAN_CH: self.pan_angle,
+                config.TILT_CH: self.tilt_angle,
+                config.GUN_CH: config.GUN_SAFE,
+            }, force=True)
 
     def fire_gun(self):
-        if self.kit:
+        """開火 (非阻塞)；上一發還沒結束則忽略，回傳是否受理"""
+        if not self.kit: return False
+        return self.engagement.engage(settle=0.0)
+
+    def engage(self, pan_delta, tilt_delta, on_done=None):
+        """先瞄準再開火 (AIM -> SETTLE -> FIRE -> SAFE)，非阻塞"""
+        return self.engagement.engage(pan_delta, tilt_delta, on_done=on_done)
+
+    def trigger(self, fire):
+        # 由 EngagementScheduler 在 FIRE / SAFE 步驟呼叫
+        if not self.kit: return
+        if fire:
             print("🔥🔥🔥 FIRE! 🔥🔥🔥")
-            
             # 播放音效 (非阻塞)
             if self.fire_sound:
                 self.fire_sound.play()
-                
-            self.kit.servo[config.GUN_CH].angle = config.GUN_FIRE
-            time.sleep(0.3)
-            self.kit.servo[config.GUN_CH].angle = config.GUN_SAFE
+        if self.writer:
+            self.writer.set(config.GUN_CH, config.GUN_FIRE if fire else config.GUN_SAFE, force=True)
 
     def manual_move(self, pan_delta, tilt_delta):
         self.pan_angle += pan_delta
@@ -64,37 +86,31 @@ class SentryHardware:
         if tilt is not None: self.tilt_angle = tilt
         self._constrain_and_move()
 
-    def update_servos(self, cx, cy):
+    def update_servos(self, cx, cy, timestamp=None):
+        """
+        依目標在畫面中的位置轉動雲台
+        timestamp 為該幀的拍攝時間 (time.monotonic)，用來補償偵測延遲與拍攝後雲台自己的轉動
+        """
         if not self.kit: return
 
-        err_x = config.CX - cx
-        err_y = config.CY - cy
-
-        if abs(err_x) < config.DEADBAND: err_x = 0
-        if abs(err_y) < config.DEADBAND: err_y = 0
-
-        delta_pan = err_x * config.KP_PAN
-        delta_tilt = err_y * config.KP_TILT
-
-        # Limit speed
-        delta_pan = max(min(delta_pan, config.MAX_STEP), -config.MAX_STEP)
-        delta_tilt = max(min(delta_tilt, config.MAX_STEP), -config.MAX_STEP)
-
+        now = time.monotonic()
+        delta_pan, delta_tilt, locked = self.controller.update(cx, cy, timestamp or now, now, self.pan_angle, self.tilt_angle)
         self.pan_angle += delta_pan
         self.tilt_angle += delta_tilt 
         
         self._constrain_and_move()
 
         # Auto fire logic
-        if self.state.auto_fire_enabled and abs(err_x) < (config.DEADBAND - 10) and abs(err_y) < (config.DEADBAND - 10):
-            print("🎯 鎖定確認！執行自動開火！")
-            self.fire_gun()
-            self.state.auto_fire_enabled = False
+        if self.state.auto_fire_enabled and locked:
+            if self.fire_gun():
+                print("🎯 鎖定確認！執行自動開火！")
+                self.state.auto_fire_enabled = False
 
     def _constrain_and_move(self):
         self.pan_angle = max(config.PAN_MIN, min(config.PAN_MAX, self.pan_angle))
         self.tilt_angle = max(config.TILT_MIN, min(config.TILT_MAX, self.tilt_angle))
+        self.angle_history.record(time.monotonic(), self.pan_angle, self.tilt_angle)
         
-        if self.kit:
-            self.kit.servo[config.PAN_CH].angle = self.pan_angle
-            self.kit.servo[config.TILT_CH].angle = self.tilt_angle
+        if self.writer:
+            # 只更新目標角度，由寫入執行緒合併後送出
+            self.writer.set_many({config.PAN_CH: self.pan_angle, config.TILT_CH: self.tilt_angle})
@@ -0,0 +1,132 @@
+import time
+import queue
+import threading
+import cv2
+
+class TensorInput:
+    """
+    零複製前處理：直接把畫面縮放進 interpreter 的輸入張量
+    以 NumPy view 當作 cv2.resize 的 dst，不再產生中間影像，也不需要 set_input 再複製一次
+    """
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        detail = interpreter.get_input_details()[0]
+        self.index = detail['index']
+        _, self.height, self.width, _ = detail['shape']
+
+    def size(self):
+        return self.width, self.height
+
+    def load(self, image):
+        # tensor() 回傳的是直接指向 interpreter 內部記憶體的 view
+        view = self.interpreter.tensor(self.index)()[0]
+        cv2.resize(image, (self.width, self.height), dst=view)
+        # invoke() 前不能持有內部張量的參考，否則 tflite 會丟出 RuntimeError
+        del view
+
+class InferenceWorker:
+    """
+    單一 interpreter 的專屬執行緒
+    每個 Edge TPU 一個 worker，彼此可以同時推論
+    """
+    def __init__(self, name, fn, on_result):
+        self.name = name
+        self.fn = fn # fn(frame, *args) -> result，內含前處理 / invoke / 後處理
+        self.on_result = on_result
+        self.q = queue.Queue(maxsize=1)
+        self.last_latency = 0.0
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def submit(self, seq, frame, args=()):
+        # 只保留最新一筆工作，來不及處理的舊幀直接丟掉
+        try:
+            self.q.get_nowait()
+        except queue.Empty:
+            pass
+        self.q.put((seq, frame, args))
+
+    def stop(self):
+        self.submit(None, None)
+
+    def _worker(self):
+        while True:
+            seq, frame, args = self.q.get()
+            if seq is None: break
+            t0 = time.monotonic()
+            try:
+                result = self.fn(frame, *args)
+            except Exception as e:
+                print(f"❌ 推論錯誤 [{self.name}]: {e}")
+                result = None
+            self.last_latency = time.monotonic() - t0
+            self.on_result(self.name, seq, result)
+
+class InferencePipeline:
+    """
+    管線化推論執行器
+    同一幀同時送進多個 worker，結果依 frame 序號合併
+    單幀延遲 = 各模型延遲的最大值，而不是總和
+    """
+    def __init__(self):
+        self.workers = {}
+        self.cond = threading.Condition()
+        self.pending = {} # seq -> {name: result}
+
+    def add_stage(self, name, fn):
+        """fn 可以包裝真實的 TPU interpreter，也可以是測試用的替身"""
+        self.workers[name] = InferenceWorker(name, fn, self._on_result)
+
+    def has_stage(self, name):
+        return name in self.workers
+
+    def _on_result(self, name, seq, result):
+        with self.cond:
+            # 已經逾時放棄的幀不再收結果
+            if seq in self.pending:
+                self.pending[seq][name] = result
+                self.cond.notify_all()
+
+    def submit(self, seq, frame, names=None, args=None):
+        """args: {stage 名稱: 額外參數 tuple}，例如 MoveNet 的 ROI"""
+        # names=None 代表全部 stage；空 list 代表這幀不跑任何推論
+        names = [n for n in (self.workers if names is None else names) if n in self.workers]
+        if not names: return names
+        args = args or {}
+        with self.cond:
+            self.pending[seq] = {}
+        for name in names:
+            self.workers[name].submit(seq, frame, args.get(name, ()))
+        return names
+
+    def collect(self, seq, names, timeout=1.0):
+        """
+        等待該幀所有 stage 完成，逾時則回傳已完成的部分結果
+        回傳 {stage 名稱: 結果}
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            results = self.pending.get(seq, {})
+            while len(results) < len(names):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"⚠️ 推論逾時 (seq={seq})，缺少: {[n for n in names if n not in results]}")
+                    break
+                self.cond.wait(remaining)
+            self.pending.pop(seq, None)
+            # 清掉比這幀還舊、已經沒人等的結果
+            for old in [s for s in self.pending if s < seq]:
+                del self.pending[old]
+            return results
+
+    def run(self, seq, frame, names=None, timeout=1.0, args=None):
+        names = self.submit(seq, frame, names, args)
+        if not names: return {}
+        return self.collect(seq, names, timeout)
+
+    def latencies(self):
+        return {name: w.last_latency for name, w in self.workers.items()}
+
+    def stop(self):
+        for w in self.workers.values():
+            w.stop()
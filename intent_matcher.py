@@ -0,0 +1,132 @@
+import re
+import config
+
+# 嘗試匯入 pypinyin 用於拼音比對
+try:
+    from pypinyin import lazy_pinyin, Style
+    HAS_PINYIN = True
+except ImportError:
+    print("⚠️ 未安裝 pypinyin，本地意圖比對將改用字元比對 (無法處理諧音)")
+    HAS_PINYIN = False
+
+# 指令詞組與常見的語音辨識誤聽 (原本寫在 Gemini 提示詞裡的知識)
+INTENT_PHRASES = {
+    "FIRE": ["開火", "發射", "射擊", "開槍", "設計", "涉及", "發癢", "發財", "開伙", "射及"],
+    "STOP": ["停止", "暫停", "休息", "停下來", "別動", "挺直", "停職"],
+    "TRACK_PERSON": ["追蹤人", "看人", "追人", "跟著人", "跟着人", "追蹤人物", "追中人"],
+    "SENTRY_MODE": ["哨兵模式", "監視模式", "開始巡邏", "巡邏模式", "少兵模式", "哨兵"],
+}
+
+# 容易混淆的聲母 / 韻母 (捲舌、前後鼻音) 先折疊成同一個音再比對
+# f/h 不折疊：「開花」「開會」會被當成「開火」，發財 / 發癢已直接列在詞組裡
+_FOLDS = [(re.compile(r"^zh"), "z"), (re.compile(r"^ch"), "c"), (re.compile(r"^sh"), "s"),
+          (re.compile(r"ng$"), "n"), (re.compile(r"^l"), "n")]
+
+SHORT_PHRASE = 2 # 音節數不超過此值的詞組必須是整句話 (只允許前面的催促詞與句尾語助詞)
+
+def to_syllables(text):
+    """中文轉成去聲調、折疊過的拼音音節；非中文字元照原樣保留"""
+    text = re.sub(r"[\s\W_]+", "", text).lower()
+    if not HAS_PINYIN:
+        return list(text)
+    syllables = []
+    for s in lazy_pinyin(text, style=Style.NORMAL, errors="default"):
+        for pattern, repl in _FOLDS:
+            s = pattern.sub(repl, s)
+        syllables.append(s)
+    return syllables
+
+def _syllable_cost(a, b):
+    """
+    兩個音節折疊後完全相同才算對上，否則整個音節算錯
+    (音節內的部分相似不給分，「開會」「開花」與「開火」只差一個韻母，卻是完全不同的話)
+    """
+    return 0.0 if a == b else 1.0
+
+# 句尾語助詞與句首的催促詞，短詞組比對前先去掉 (「開火吧」「休息一下」「幫我開火」)
+_TRAILING = [to_syllables(w) for w in ("一下", "吧", "啊", "呀", "了", "啦", "嘛", "呢", "喔")]
+_LEADING = [to_syllables(w) for w in ("快點", "快点", "快", "幫我", "帮我", "給我", "给我", "請", "请",
+                                      "馬上", "马上", "立刻", "趕快", "赶快", "現在", "现在", "再")]
+# 否定詞：出現在詞組之前就不在本地判定 (「不要開火」「別開火」交給 Gemini)
+_NEGATIONS = [to_syllables(w) for w in ("不", "別", "别", "沒", "没", "勿", "停止", "禁止", "甭")]
+
+def _strip(syllables, words, tail):
+    stripped = True
+    while stripped:
+        stripped = False
+        for w in words:
+            if len(syllables) <= len(w): continue
+            if (syllables[-len(w):] if tail else syllables[:len(w)]) == w:
+                syllables = syllables[:-len(w)] if tail else syllables[len(w):]
+                stripped = True
+    return syllables
+
+def strip_trailing(syllables):
+    """去掉句尾的語助詞音節"""
+    return _strip(syllables, _TRAILING, tail=True)
+
+def strip_leading(syllables):
+    """去掉句首的催促詞音節"""
+    return _strip(syllables, _LEADING, tail=False)
+
+def has_negation(syllables):
+    """音節序列中是否含有否定詞"""
+    return any(syllables[i:i + len(w)] == w for w in _NEGATIONS for i in range(len(syllables) - len(w) + 1))
+
+def substring_distance(pattern, text, anchored=False):
+    """
+    音節層級的近似子字串比對 (semi-global alignment)，回傳 (距離, 對到的起點)
+    pattern 必須完整比對；anchored=False 時 text 前後多出來的音節不計成本，例如「追蹤人然後開火」也能對到「追蹤人」；
+    anchored=True 時 pattern 必須對齊整個 text
+    """
+    prev = [float(j) if anchored else 0.0 for j in range(len(text) + 1)]
+    start = list(range(len(text) + 1)) # 每一格對應的對齊起點
+    for i, p in enumerate(pattern, 1):
+        cur, cur_start = [float(i)], [0]
+        for j, t in enumerate(text, 1):
+            options = ((prev[j] + 1, start[j]), (cur[j - 1] + 1, cur_start[j - 1]),
+                       (prev[j - 1] + _syllable_cost(p, t), start[j - 1]))
+            cost, origin = min(options)
+            cur.append(cost)
+            cur_start.append(origin)
+        prev, start = cur, cur_start
+    end = len(text) if anchored else min(range(len(prev)), key=lambda j: prev[j])
+    return prev[end], start[end]
+
+class IntentMatcher:
+    """
+    本地拼音模糊意圖比對，放在 Gemini 意圖判斷之前
+    預先把所有指令詞組轉成拼音索引，辨識結果轉拼音後以編輯距離比對；
+    分數低於門檻才交給 ask_gemini_intent
+    """
+    def __init__(self, phrases=INTENT_PHRASES, threshold=config.INTENT_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.index = [(intent, phrase, to_syllables(phrase)) for intent, items in phrases.items() for phrase in items]
+
+    def best(self, text):
+        """回傳 (intent, score, phrase)，score 為 0-1；同分時取較長的詞組 (例如「追蹤人然後開火」應為追蹤)"""
+        syllables = to_syllables(text)
+        best = (None, 0.0, None)
+        best_len = 0
+        if not syllables: return best
+        core = strip_leading(strip_trailing(syllables))
+        for intent, phrase, pattern in self.index:
+            if len(pattern) <= SHORT_PHRASE:
+                # 兩個音節的詞組太容易出現在別的句子裡 (「開貨車」「恭喜發財」「今天開伙吧」)，必須是整句話
+                distance, _ = substring_distance(pattern, core, anchored=True)
+            else:
+                distance, origin = substring_distance(pattern, syllables)
+                if has_negation(syllables[:origin]): continue # 「不要追蹤人」
+            score = 1.0 - distance / len(pattern)
+            if score > best[1] or (score == best[1] and len(pattern) > best_len):
+                best = (intent, score, phrase)
+                best_len = len(pattern)
+        return best
+
+    def match(self, text):
+        """分數達門檻回傳 intent 字串，否則回傳 None (交給 Gemini)"""
+        intent, score, phrase = self.best(text)
+        if intent and score >= self.threshold:
+            print(f"🎯 本地意圖比對: {text} -> {intent} (「{phrase}」, {score:.2f})")
+            return intent
+        return None
@@ -0,0 +1,203 @@
+import collections
+
+# COCO 類別的中文別名 (繁體 / 簡體 / 常見說法)，英文名稱會自動加入
+COCO_ALIASES = {
+    "person": ["人", "人物", "行人", "路人"],
+    "bicycle": ["腳踏車", "脚踏车", "自行車", "自行车", "單車", "单车"],
+    "car": ["汽車", "汽车", "車子", "车子", "轎車", "轿车"],
+    "motorcycle": ["機車", "机车", "摩托車", "摩托车"],
+    "airplane": ["飛機", "飞机"],
+    "bus": ["公車", "公车", "巴士", "公交車", "公交车"],
+    "train": ["火車", "火车", "列車", "列车"],
+    "truck": ["卡車", "卡车", "貨車", "货车"],
+    "boat": ["船", "小船"],
+    "traffic light": ["紅綠燈", "红绿灯", "交通號誌", "交通号志"],
+    "fire hydrant": ["消防栓"],
+    "stop sign": ["停車標誌", "停车标志"],
+    "parking meter": ["停車計時器", "停车计时器"],
+    "bench": ["長椅", "长椅", "板凳"],
+    "bird": ["鳥", "鸟", "小鳥", "小鸟"],
+    "cat": ["貓", "猫", "貓咪", "猫咪"],
+    "dog": ["狗", "小狗", "狗狗"],
+    "horse": ["馬", "马"],
+    "sheep": ["羊", "綿羊", "绵羊"],
+    "cow": ["牛", "乳牛"],
+    "elephant": ["大象"],
+    "bear": ["熊"],
+    "zebra": ["斑馬", "斑马"],
+    "giraffe": ["長頸鹿", "长颈鹿"],
+    "backpack": ["背包", "書包", "书包"],
+    "umbrella": ["雨傘", "雨伞", "傘", "伞"],
+    "handbag": ["手提包", "包包", "手提袋"],
+    "tie": ["領帶", "领带"],
+    "suitcase": ["行李箱", "手提箱"],
+    "frisbee": ["飛盤", "飞盘"],
+    "skis": ["滑雪板", "雪橇"],
+    "snowboard": ["單板滑雪板", "单板滑雪板"],
+    "sports ball": ["球", "足球", "籃球", "篮球", "皮球"],
+    "kite": ["風箏", "风筝"],
+    "baseball bat": ["球棒", "棒球棍"],
+    "baseball glove": ["棒球手套"],
+    "skateboard": ["滑板"],
+    "surfboard": ["衝浪板", "冲浪板"],
+    "tennis racket": ["網球拍", "网球拍", "球拍"],
+    "bottle": ["瓶子", "水瓶", "寶特瓶", "宝特瓶"],
+    "wine glass": ["酒杯", "高腳杯", "高脚杯"],
+    "cup": ["杯子", "馬克杯", "马克杯", "水杯", "茶杯", "咖啡杯"],
+    "fork": ["叉子"],
+    "knife": ["刀子", "刀"],
+    "spoon": ["湯匙", "汤匙", "勺子"],
+    "bowl": ["碗"],
+    "banana": ["香蕉"],
+    "apple": ["蘋果", "苹果"],
+    "sandwich": ["三明治"],
+    "orange": ["橘子", "柳丁", "柳橙", "橙子"],
+    "broccoli": ["花椰菜", "西蘭花", "西兰花"],
+    "carrot": ["紅蘿蔔", "红萝卜", "胡蘿蔔", "胡萝卜"],
+    "hot dog": ["熱狗", "热狗"],
+    "pizza": ["披薩", "披萨", "比薩"],
+    "donut": ["甜甜圈"],
+    "cake": ["蛋糕"],
+    "chair": ["椅子"],
+    "couch": ["沙發", "沙发"],
+    "potted plant": ["盆栽", "植物", "花盆"],
+    "bed": ["床"],
+    "dining table": ["餐桌", "桌子"],
+    "toilet": ["馬桶", "马桶"],
+    "tv": ["電視", "电视", "螢幕", "屏幕"],
+    "laptop": ["筆電", "笔电", "筆記型電腦", "笔记本电脑", "電腦", "电脑"],
+    "mouse": ["滑鼠", "鼠標", "鼠标"],
+    "remote": ["遙控器", "遥控器"],
+    "keyboard": ["鍵盤", "键盘"],
+    "cell phone": ["手機", "手机", "電話", "电话"],
+    "microwave": ["微波爐", "微波炉"],
+    "oven": ["烤箱"],
+    "toaster": ["烤麵包機", "烤面包机"],
+    "sink": ["水槽", "洗手台"],
+    "refrigerator": ["冰箱"],
+    "book": ["書", "书", "書本", "书本"],
+    "clock": ["時鐘", "时钟", "鬧鐘", "闹钟"],
+    "vase": ["花瓶"],
+    "scissors": ["剪刀"],
+    "teddy bear": ["泰迪熊", "玩偶", "娃娃", "布偶"],
+    "hair drier": ["吹風機", "吹风机"],
+    "toothbrush": ["牙刷"],
+}
+
+# 別名必須緊接在追蹤動詞之後才算目標，中間只允許「我的 / 那個」之類的字：
+# 否則「機器人」「馬上開火」「打電話給我」「開貨車」都會被當成追蹤指令，
+# 「找紅色的杯子」這種帶形容詞的描述也會丟掉顏色 (交給 Gemini 搜尋)
+TRACK_VERBS = ("追蹤", "追踪", "追", "跟著", "跟着", "跟", "鎖定", "锁定", "找到", "找", "看", "track", "follow", "find")
+FILLERS = ("一下", "我的", "你的", "他的", "那個", "這個", "那个", "这个", "一個", "一个", "那", "這", "这", "我", "的", " ")
+
+def read_coco_labels(path):
+    """
+    讀取標籤檔，支援兩種格式：
+    - 每行一個名稱，行號即為類別 ID (coral test_data 的 coco_labels.txt)
+    - 每行「ID 名稱」
+    'n/a' 佔位的行會被略過
+    """
+    labels = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for row, line in enumerate(f):
+            line = line.strip()
+            if not line: continue
+            pair = line.split(maxsplit=1)
+            if len(pair) == 2 and pair[0].isdigit():
+                pid, name = int(pair[0]), pair[1]
+            else:
+                pid, name = row, line
+            if name != "n/a":
+                labels[pid] = name
+    return labels
+
+class AhoCorasick:
+    """多模式字串比對自動機：對輸入掃一次就能找到所有出現的別名"""
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]] # 每個狀態結束的 (長度, 值)
+
+    def add(self, word, value):
+        state = 0
+        for ch in word:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = nxt
+        self.output[state].append((len(word), value))
+
+    def build(self):
+        # BFS 建立失敗連結，並把失敗狀態的輸出合併進來
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+        return self
+
+    def iter(self, text):
+        """產生 (結束位置, 長度, 值)"""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for length, value in self.output[state]:
+                yield i, length, value
+
+class LabelIndex:
+    """
+    COCO 類別的中英文別名索引
+    編譯成 Aho-Corasick 自動機，語音辨識結果掃一次即可找出最長的目標名稱，
+    例如「追蹤杯子」→ cup，本地就能處理，不必詢問 Gemini
+    """
+    def __init__(self, labels, aliases=COCO_ALIASES):
+        self.labels = labels # id -> 英文名稱
+        self.automaton = AhoCorasick()
+        for pid, name in labels.items():
+            words = {name.lower(), name.lower().replace(" ", "")} | set(aliases.get(name, []))
+            for word in words:
+                self.automaton.add(word, (pid, name))
+        self.automaton.build()
+
+    @staticmethod
+    def _only_fillers(text):
+        while text:
+            filler = next((f for f in FILLERS if text.startswith(f)), None)
+            if filler is None: return False
+            text = text[len(filler):]
+        return True
+
+    @classmethod
+    def _after_track_verb(cls, text, start):
+        """text[start:] 之前是否為「追蹤動詞 + 可有可無的虛詞」"""
+        prefix = text[:start]
+        for verb in TRACK_VERBS:
+            idx = prefix.rfind(verb)
+            if idx >= 0 and cls._only_fillers(prefix[idx + len(verb):]):
+                return True
+        return False
+
+    def find(self, text):
+        """
+        回傳最長的匹配 (id, 英文名稱, 對到的字)，沒有則回傳 None；同長度取最先出現者
+        只接受追蹤動詞後面的別名 (「追蹤杯子」「找我的書本」)
+        """
+        text = text.lower()
+        best = None
+        for end, length, (pid, name) in self.automaton.iter(text):
+            if not self._after_track_verb(text, end - length + 1):
+                continue
+            if best is None or length > best[0]:
+                best = (length, pid, name, text[end - length + 1:end + 1])
+        return best[1:] if best else None
@@ -4,6 +4,8 @@ from hardware import SentryHardware
 from ai_vision import VisionSystem
 from voice import VoiceSystem
 from web_server import create_app
+from async_server import AsyncServer
+from control_channel import ControlChannel
 from audio import AudioSystem
 
 def main():
@@ -24,7 +26,12 @@ def main():
     voice = VoiceSystem(state, hardware, vision) # VoiceSystem 暫時不需要 audio，或之後再加
     
     # 6. 初始化網頁 (傳入 audio)
-    app = create_app(state, hardware, audio)
+    if config.SERVER_MODE == "async":
+        # asyncio 伺服器自己處理串流、控制與遙測 (含 WebSocket)
+        server = AsyncServer(state, hardware, audio)
+    else:
+        app = create_app(state, hardware, audio)
+        control = ControlChannel(state, hardware, audio) # WebSocket 手動控制
 
     # 7. 啟動執行緒
     threads = []
@@ -37,11 +44,17 @@ def main():
     t_voice.start()
     threads.append(t_voice)
     
+    if config.SERVER_MODE != "async":
+        control.start()
+    
     print("✅ 系統全模組啟動完成")
     
     # 7. 啟動網頁伺服器 (Blocking)
     try:
-        app.run(host='0.0.0.0', port=5000, debug=False)
+        if config.SERVER_MODE == "async":
+            server.run(host='0.0.0.0', port=5000)
+        else:
+            app.run(host='0.0.0.0', port=5000, debug=False)
     except KeyboardInterrupt:
         state.running = False
         print("系統關閉中...")
@@ -0,0 +1,86 @@
+import collections
+import numpy as np
+import cv2
+import config
+
+class MotionScheduler:
+    """
+    以動態量決定每一幀要不要跑 SSD / MoveNet (取代固定的 MOVENET_SKIP_FRAMES)
+    - 把畫面縮成小張灰階圖，與各模型上次推論時的參考圖做差，平均差值即為動態分數
+    - 畫面沒變化就沿用快取結果；超過最大過期時間一定重跑，確保靜止的人也會被定期確認
+    - 所有決策都記在 counters，方便觀察 TPU 使用率
+    """
+    SIZE = (80, 60)
+
+    def __init__(self, threshold=config.MOTION_THRESHOLD,
+                 ssd_max_staleness=config.SSD_MAX_STALENESS,
+                 movenet_max_staleness=config.MOVENET_MAX_STALENESS,
+                 movenet_stride=config.MOVENET_SKIP_FRAMES,
+                 ssd_stride=config.SSD_SKIP_FRAMES):
+        self.threshold = threshold
+        self.max_staleness = {"detect": ssd_max_staleness, "movenet": movenet_max_staleness}
+        # 有動態時的最高頻率上限 (每 N 幀最多跑一次)，中間由追蹤器預測補上
+        self.strides = {"detect": max(1, ssd_stride), "movenet": max(1, movenet_stride)}
+        self.frames_since = {"detect": 0, "movenet": 0}
+        # 預先配置的小圖 buffer，每幀不再配置新記憶體
+        w, h = self.SIZE
+        self.small = np.zeros((h, w, 3), np.uint8)
+        self.gray = np.zeros((h, w), np.uint8)
+        self.diff = np.zeros((h, w), np.uint8)
+        self.refs = {"detect": np.zeros((h, w), np.uint8), "movenet": np.zeros((h, w), np.uint8)}
+        self.last_run = {"detect": None, "movenet": None}
+        self.last_mode = None
+        self.motion = 0.0
+        self.counters = collections.Counter()
+
+    def _motion_against(self, name):
+        cv2.absdiff(self.gray, self.refs[name], dst=self.diff)
+        return float(self.diff.mean())
+
+    def _should_run(self, name, now, forced):
+        last = self.last_run[name]
+        if forced or last is None:
+            return True, "forced"
+        if now - last >= self.max_staleness[name]:
+            return True, "stale"
+        score = self._motion_against(name)
+        if name == "detect": self.motion = score
+        if score < self.threshold:
+            return False, "static"
+        if self.frames_since[name] < self.strides[name]:
+            return False, "stride"
+        return True, "motion"
+
+    def _step(self, name, now, forced):
+        self.frames_since[name] += 1
+        run, reason = self._should_run(name, now, forced)
+        self.counters[f"{name}_{reason}"] += 1
+        if run:
+            self.counters[f"{name}_run"] += 1
+            self.frames_since[name] = 0
+            self.last_run[name] = now
+            self.refs[name][:] = self.gray
+        return run
+
+    def decide(self, frame, now, mode, movenet_available=True):
+        """回傳 (run_ssd, run_movenet)"""
+        cv2.resize(frame, self.SIZE, dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+
+        # 模式切換時一律重跑，讓畫面立刻反映新的模式
+        forced = mode != self.last_mode
+        self.last_mode = mode
+        self.counters["frames"] += 1
+
+        run_ssd = self._step("detect", now, forced)
+        run_movenet = movenet_available and self._step("movenet", now, forced)
+        return run_ssd, run_movenet
+
+    def stats(self):
+        """各模型的執行次數與 duty cycle (實際執行 / 總幀數)"""
+        frames = max(1, self.counters["frames"])
+        stats = dict(self.counters)
+        stats["detect_duty"] = self.counters["detect_run"] / frames
+        stats["movenet_duty"] = self.counters["movenet_run"] / frames
+        stats["motion"] = self.motion
+        return stats
@@ -0,0 +1,84 @@
+import collections
+import config
+
+class SedentaryEntry:
+    """單一個人的靜止計時狀態"""
+    __slots__ = ("track_id", "timer", "last_cx", "last_cy", "last_check", "last_seen", "warned", "box")
+
+    def __init__(self, track_id, cx, cy, now):
+        self.track_id = track_id
+        self.timer = 0 # 連續靜止秒數
+        self.last_cx = cx
+        self.last_cy = cy
+        self.last_check = now
+        self.last_seen = now
+        self.warned = False # 半時警告只播一次
+        self.box = None
+
+    def reset(self):
+        self.timer = 0
+        self.warned = False
+
+class SedentaryTable:
+    """
+    哨兵模式的每人久坐計時表 (以 track ID 為 key)
+    - 每個人有自己的計時器、上次位置、警告狀態與最後出現時間
+    - 表以 OrderedDict 依最後出現時間排序，過期的人一定在最前面，
+      每幀只需處理畫面上的人與真正過期的項目，不必掃過所有歷史紀錄
+    """
+    def __init__(self, timeout=config.SENTRY_TIMEOUT, move_threshold=config.SENTRY_MOVE_THRESHOLD, expire=config.SENTRY_EXPIRE):
+        self.timeout = timeout
+        # config.SENTRY_MOVE_THRESHOLD 以角度表示，約 1 度 ~ 10 像素
+        self.pixel_threshold = move_threshold * 10
+        self.expire = expire
+        self.entries = collections.OrderedDict()
+
+    def update(self, tracks, now):
+        """tracks: 這一幀畫面上的人 (tracking.KalmanTrack)"""
+        for t in tracks:
+            cx, cy = t.center()
+            entry = self.entries.get(t.id)
+            if entry is None:
+                entry = self.entries[t.id] = SedentaryEntry(t.id, cx, cy, now)
+            else:
+                self.entries.move_to_end(t.id)
+                # 每秒檢查一次位移
+                if now - entry.last_check >= 1.0:
+                    dist = ((cx - entry.last_cx) ** 2 + (cy - entry.last_cy) ** 2) ** 0.5
+                    if dist < self.pixel_threshold:
+                        entry.timer += 1
+                    else:
+                        entry.reset() # 有移動就重新計時
+                    entry.last_cx, entry.last_cy = cx, cy
+                    entry.last_check = now
+            entry.last_seen = now
+            entry.box = t.box()
+
+        # 最前面的是最久沒出現的，過期的依序移除
+        while self.entries:
+            entry = next(iter(self.entries.values()))
+            if now - entry.last_seen <= self.expire: break
+            self.entries.popitem(last=False)
+
+    def visible(self, now):
+        """這一幀有看到的人 (從最後面往前取，遇到沒看到的就停)"""
+        people = []
+        for entry in reversed(self.entries.values()):
+            if entry.last_seen != now: break
+            people.append(entry)
+        return people
+
+    def due_warnings(self, now):
+        """超過一半時間、還沒警告過的人"""
+        return [e for e in self.visible(now) if not e.warned and e.timer > self.timeout / 2]
+
+    def next_target(self, now):
+        """已經超時的人中靜止最久的一位 (一次只處理一個，依序輪流)"""
+        due = [e for e in self.visible(now) if e.timer >= self.timeout]
+        return max(due, key=lambda e: e.timer) if due else None
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
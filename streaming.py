@@ -0,0 +1,193 @@
+import time
+import threading
+import cv2
+import config
+
+BOUNDARY = b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n'
+
+# 自適應模式的品質階梯 (scale, quality)，由高到低
+QUALITY_TIERS = [
+    (1.0, config.STREAM_DEFAULT_QUALITY),
+    (1.0, 70),
+    (0.75, 60),
+    (0.5, 50),
+    (0.5, 35),
+    (0.25, 30),
+]
+
+class MJPEGBroadcaster:
+    """
+    MJPEG 廣播器：每個新版本的畫面只編碼一次，同一份 bytes 分送給所有觀看者
+    - 編碼結果依 (scale, quality) 分組快取，同一品質等級的客戶端共用一次編碼
+    - 沒有觀看者時編碼執行緒休眠，完全不做 JPEG 編碼
+    - 慢的客戶端只會拿到最新一張，中間的幀直接跳過，不會排隊
+    """
+    def __init__(self, frames):
+        self.frames = frames # config.FrameExchange
+        self.cond = threading.Condition()
+        self.variants = {} # (scale, quality) -> 訂閱數
+        self.version = 0
+        self.cache = {} # (scale, quality) -> 目前版本的 JPEG bytes
+        self.listeners = [] # 每次編好新版本時呼叫 fn(version, cache) (asyncio 伺服器用)
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def _worker(self):
+        encoded_version = 0
+        while True:
+            with self.cond:
+                # 沒人看就不編碼
+                self.cond.wait_for(lambda: len(self.variants) > 0)
+                keys = list(self.variants)
+
+            version, frame = self.frames.wait_newer(encoded_version, timeout=1.0)
+            if frame is None or version == encoded_version:
+                continue
+            encoded_version = version
+
+            cache = {}
+            for key in keys:
+                jpeg = self._encode(frame, *key)
+                if jpeg is not None: cache[key] = jpeg
+            with self.cond:
+                self.cache = cache
+                self.version = version
+                self.cond.notify_all()
+            # cache 每個版本都是新的 dict，發佈後不再修改，可以直接把參考交出去
+            for fn in self.listeners:
+                fn(version, cache)
+
+    def _encode(self, frame, scale, quality):
+        if scale != 1.0:
+            h, w = frame.shape[:2]
+            frame = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        ok, enc = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        return enc.tobytes() if ok else None
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def wait_jpeg(self, last_version, key, timeout=1.0):
+        """等待比 last_version 新、且已編好 key 這個品質的 JPEG，回傳 (version, bytes)"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version > last_version and key in self.cache, timeout)
+            return self.version, self.cache.get(key)
+
+    def subscribe(self, key):
+        with self.cond:
+            self.variants[key] = self.variants.get(key, 0) + 1
+            self.cond.notify_all()
+
+    def unsubscribe(self, key):
+        with self.cond:
+            self.variants[key] -= 1
+            if self.variants[key] <= 0:
+                del self.variants[key]
+
+    def stream(self, scale=1.0, quality=config.STREAM_DEFAULT_QUALITY, fps=None, adaptive=False):
+        """給 Flask Response 使用的 multipart generator"""
+        client = ClientStream(scale, quality, fps, adaptive)
+        key = client.key()
+        self.subscribe(key)
+        try:
+            version = 0
+            while True:
+                client.throttle()
+                new_version, jpeg = self.wait_jpeg(version, key)
+                if jpeg is None or new_version == version:
+                    continue
+                version = new_version
+
+                t0 = time.monotonic()
+                yield BOUNDARY + jpeg + b'\r\n'
+                # generator 恢復執行時，上一段資料已經寫進 socket，經過的時間就是送出耗時
+                client.record_send(len(jpeg), time.monotonic() - t0)
+
+                new_key = client.key()
+                if new_key != key:
+                    self.subscribe(new_key)
+                    self.unsubscribe(key)
+                    key = new_key
+        finally:
+            # 客戶端斷線時 generator 會被關閉，在這裡退訂
+            self.unsubscribe(key)
+
+def parse_stream_args(args):
+    """
+    解析 /video_feed 參數：scale (0.1-1.0) 或 width、quality (10-100)、fps、adaptive=1
+    回傳 (scale, quality, fps, adaptive)，格式錯誤丟出 ValueError
+    """
+    scale = float(args.get('scale', 1.0))
+    if 'width' in args:
+        scale = float(args['width']) / (config.CX * 2)
+    quality = int(args.get('quality', config.STREAM_DEFAULT_QUALITY))
+    fps = float(args['fps']) if args.get('fps') else None
+    adaptive = args.get('adaptive', '0').lower() in ('1', 'true')
+    return scale, quality, fps, adaptive
+
+class ClientStream:
+    """
+    單一觀看者的串流參數與自適應控制
+    依量到的送出吞吐量估計每張圖的送出延遲，超過上限就降品質 / 解析度 / 幀率
+    """
+    def __init__(self, scale=1.0, quality=config.STREAM_DEFAULT_QUALITY, fps=None, adaptive=False):
+        self.scale = min(1.0, max(0.1, scale))
+        self.quality = min(100, max(10, int(quality)))
+        self.max_fps = fps
+        self.fps = fps
+        self.adaptive = adaptive
+        self.tier = 0
+        self.throughput = None # bytes/s (EWMA)
+        self.good_frames = 0
+        self.last_send = 0.0
+
+        if adaptive:
+            # 從最接近要求畫質的等級開始
+            for i, (s, q) in enumerate(QUALITY_TIERS):
+                if s <= self.scale and q <= self.quality:
+                    self.tier = i
+                    break
+
+    def key(self):
+        if self.adaptive:
+            return QUALITY_TIERS[self.tier]
+        return (self.scale, self.quality)
+
+    def throttle_delay(self):
+        """距離下一張還要等幾秒 (沒有幀率限制則為 0)"""
+        if not self.fps: return 0.0
+        return max(0.0, 1.0 / self.fps - (time.monotonic() - self.last_send))
+
+    def throttle(self):
+        if not self.fps: return
+        wait = self.throttle_delay()
+        if wait > 0:
+            time.sleep(wait)
+        self.last_send = time.monotonic()
+
+    def record_send(self, size, elapsed):
+        if not self.adaptive: return
+        rate = size / max(elapsed, 1e-4)
+        self.throughput = rate if self.throughput is None else 0.7 * self.throughput + 0.3 * rate
+        est_latency = size / self.throughput
+
+        if est_latency > config.STREAM_MAX_LATENCY:
+            self.good_frames = 0
+            if self.tier < len(QUALITY_TIERS) - 1:
+                self.tier += 1
+            else:
+                # 已經是最低畫質，再降幀率
+                self.fps = max(1.0, (self.fps or 20.0) / 2)
+        elif est_latency < config.STREAM_MAX_LATENCY * 0.3:
+            self.good_frames += 1
+            # 連續穩定一段時間才升級，避免來回震盪
+            if self.good_frames >= 30:
+                self.good_frames = 0
+                if self.fps != self.max_fps:
+                    # 先把幀率恢復，再恢復畫質
+                    ceiling = self.max_fps or 20.0
+                    self.fps = self.fps * 2
+                    if self.fps >= ceiling:
+                        self.fps = self.max_fps
+                elif self.tier > 0:
+                    self.tier -= 1
@@ -0,0 +1,352 @@
+import time
+import numpy as np
+import cv2
+import config
+
+def iou_matrix(a, b):
+    """a: (N, 4), b: (M, 4) [xmin, ymin, xmax, ymax] -> (N, M) IoU"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), np.float32)
+    a = np.asarray(a, np.float32)[:, None, :]
+    b = np.asarray(b, np.float32)[None, :, :]
+    iw = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+class KalmanTrack:
+    """
+    單一目標的等速 Kalman 濾波器
+    狀態: [cx, cy, w, h, vx, vy]，量測: [cx, cy, w, h]
+    """
+    H = np.hstack([np.eye(4), np.zeros((4, 2))])
+    R = np.diag([4.0, 4.0, 16.0, 16.0]) ** 2 / 4 # 量測雜訊 (像素)
+
+    def __init__(self, track_id, box, class_id, score):
+        self.id = track_id
+        self.class_id = int(class_id)
+        self.score = float(score)
+        self.x = np.zeros(6)
+        self.x[:4] = self._to_z(box)
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1000.0, 1000.0])
+        self.hits = 1
+        self.misses = 0 # 連續幾次偵測沒對到
+
+    @staticmethod
+    def _to_z(box):
+        xmin, ymin, xmax, ymax = box
+        return np.array([(xmin + xmax) / 2, (ymin + ymax) / 2, xmax - xmin, ymax - ymin], float)
+
+    def predict(self, dt):
+        F = np.eye(6)
+        F[0, 4] = F[1, 5] = dt
+        # 加速度造成的過程雜訊，時間越長不確定性越大
+        q = config.TRACK_PROCESS_NOISE
+        Q = np.diag([dt * dt * q, dt * dt * q, dt * q, dt * q, q, q])
+        self.x = F @ self.x
+        self.x[2:4] = np.maximum(self.x[2:4], 1.0)
+        self.P = F @ self.P @ F.T + Q
+
+    def update(self, box, score):
+        z = self._to_z(box)
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - self.H @ self.x)
+        self.P = (np.eye(6) - K @ self.H) @ self.P
+        self.score = float(score)
+        self.hits += 1
+        self.misses = 0
+
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        return (int(cx - w / 2), int(cy - h / 2), int(cx + w / 2), int(cy + h / 2))
+
+    def center(self):
+        return int(self.x[0]), int(self.x[1])
+
+    def velocity(self):
+        return float(self.x[4]), float(self.x[5])
+
+class MultiObjectTracker:
+    """
+    輕量多目標追蹤 (Kalman 預測 + IoU 關聯)，給 SSD 偵測結果持續的 track ID
+    - 有偵測的幀：預測後以 IoU 貪婪配對 (同類別才配對)
+    - 沒跑偵測的幀：只做預測，填補偵測之間的空檔
+    - 鎖定的目標只要還活著就不會換人，伺服馬達始終跟著同一個 ID
+    """
+    def __init__(self, iou_threshold=config.TRACK_IOU_THRESHOLD, max_misses=config.TRACK_MAX_MISSES, min_hits=config.TRACK_MIN_HITS):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.tracks = []
+        self.next_id = 1
+        self.locked_id = None
+        self.last_time = None
+
+    def _predict(self, now):
+        dt = 0.0 if self.last_time is None else max(0.0, now - self.last_time)
+        self.last_time = now
+        for t in self.tracks:
+            t.predict(dt)
+
+    def predict(self, now):
+        """沒有偵測結果時呼叫，只推進 Kalman 預測"""
+        self._predict(now)
+        return self.confirmed()
+
+    def update(self, boxes, class_ids, scores, now):
+        """有新的偵測結果時呼叫，boxes 為 (N, 4) 畫面座標"""
+        self._predict(now)
+
+        iou = iou_matrix([t.box() for t in self.tracks], boxes)
+        if iou.size:
+            # 不同類別不能配對
+            same_class = np.array([t.class_id for t in self.tracks])[:, None] == np.asarray(class_ids)[None, :]
+            iou = np.where(same_class, iou, 0.0)
+
+        matched_tracks, matched_dets = set(), set()
+        # 貪婪配對：IoU 由大到小
+        if iou.size:
+            for flat in np.argsort(-iou, axis=None):
+                ti, di = np.unravel_index(flat, iou.shape)
+                if iou[ti, di] < self.iou_threshold: break
+                if ti in matched_tracks or di in matched_dets: continue
+                self.tracks[ti].update(boxes[di], scores[di])
+                matched_tracks.add(ti)
+                matched_dets.add(di)
+
+        for ti, t in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                t.misses += 1
+
+        for di in range(len(boxes)):
+            if di not in matched_dets:
+                self.tracks.append(KalmanTrack(self.next_id, boxes[di], class_ids[di], scores[di]))
+                self.next_id += 1
+
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        return self.confirmed()
+
+    def confirmed(self):
+        """對到 min_hits 次以上的軌跡 (單幀的誤判不會被顯示或鎖定)"""
+        return [t for t in self.tracks if t.hits >= self.min_hits]
+
+    def get(self, track_id):
+        for t in self.tracks:
+            if t.id == track_id: return t
+        return None
+
+    def best(self, class_id):
+        """分數最高的該類別 track"""
+        candidates = [t for t in self.confirmed() if t.class_id == class_id]
+        return max(candidates, key=lambda t: t.score) if candidates else None
+
+    def select_target(self, class_id):
+        """
+        回傳要追的 track：已鎖定的目標還在就繼續追，否則改鎖分數最高的同類別目標
+        class_id 為 None 時解除鎖定
+        """
+        if class_id is None:
+            self.locked_id = None
+            return None
+        locked = self.get(self.locked_id) if self.locked_id is not None else None
+        if locked is not None and locked.class_id == class_id:
+            return locked
+        target = self.best(class_id)
+        self.locked_id = target.id if target else None
+        return target
+
+class TemplateReacquirer:
+    """
+    GEMINI_TRACK 追丟時的本地重新偵測
+    以 Gemini 初始化的 bbox 建立多尺度樣板 (template pyramid)，
+    追丟後在上次位置附近的搜尋視窗內做樣板比對，有時間預算限制；
+    連續追丟越久搜尋視窗越大 (有上限)，視窗太大時搜尋區與樣板一起縮小，單次搜尋維持在預算內；
+    超過時限才回頭請 Gemini 重新搜尋
+    """
+    SCALES = (1.0, 0.9, 1.1, 0.8, 1.25)
+
+    def __init__(self, threshold=config.REACQUIRE_THRESHOLD, window=config.REACQUIRE_WINDOW, budget=config.REACQUIRE_BUDGET_MS / 1000.0,
+                 max_window=config.REACQUIRE_MAX_WINDOW, max_pixels=config.REACQUIRE_MAX_PIXELS):
+        self.threshold = threshold
+        self.window = window # 搜尋視窗為目標框的幾倍
+        self.max_window = max_window # 視窗放大的上限 (目標框的幾倍)
+        self.max_pixels = max_pixels # 搜尋區超過這個像素數就縮小後再比對
+        self.budget = budget # 每幀最多花多少秒搜尋
+        self.template = None
+        self.last_box = None
+        self.misses = 0
+
+    def init(self, frame, bbox):
+        """bbox: (x, y, w, h)，frame 需為乾淨畫面"""
+        x, y, w, h = [int(v) for v in bbox]
+        crop = frame[max(y, 0):y+h, max(x, 0):x+w]
+        if crop.size == 0:
+            self.template = None
+            return
+        self.template = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        self.last_box = (x, y, w, h)
+        self.misses = 0
+
+    def update_box(self, bbox):
+        """追蹤成功時更新最後位置"""
+        self.last_box = tuple(int(v) for v in bbox)
+        self.misses = 0
+
+    def search(self, frame):
+        """回傳找回的 (x, y, w, h) 或 None"""
+        if self.template is None or self.last_box is None: return None
+        t0 = time.monotonic()
+        self.misses += 1
+
+        fh, fw = frame.shape[:2]
+        x, y, w, h = self.last_box
+        # 追丟越久，視窗越大 (到 max_window 為止)
+        factor = min(self.window * (1 + 0.5 * (self.misses - 1)), self.max_window)
+        cx, cy = x + w // 2, y + h // 2
+        sw, sh = int(w * factor), int(h * factor)
+        x0, y0 = max(cx - sw // 2, 0), max(cy - sh // 2, 0)
+        x1, y1 = min(cx + sw // 2, fw), min(cy + sh // 2, fh)
+        if x1 <= x0 or y1 <= y0: return None
+        region = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+
+        # 搜尋區太大就連同樣板一起縮小 (matchTemplate 的成本與搜尋區面積成正比)
+        th, tw = self.template.shape[:2]
+        ds = min(1.0, max((self.max_pixels / region.size) ** 0.5, 8.0 / min(tw, th))) # 樣板至少保留 8 像素
+        if ds < 1.0:
+            region = cv2.resize(region, None, fx=ds, fy=ds, interpolation=cv2.INTER_AREA)
+
+        best_score, best_box = -1.0, None
+        for scale in self.SCALES:
+            if time.monotonic() - t0 > self.budget: break
+            sw_, sh_ = int(tw * scale), int(th * scale)
+            dw, dh = int(sw_ * ds), int(sh_ * ds)
+            if dw < 8 or dh < 8 or dw > region.shape[1] or dh > region.shape[0]: continue
+            templ = self.template if (dw, dh) == (tw, th) else cv2.resize(self.template, (dw, dh), interpolation=cv2.INTER_AREA)
+            res = cv2.matchTemplate(region, templ, cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(res)
+            if score > best_score:
+                best_score, best_box = score, (x0 + int(loc[0] / ds), y0 + int(loc[1] / ds), sw_, sh_)
+
+        if best_score >= self.threshold:
+            self.update_box(best_box)
+            print(f"🔎 本地重新鎖定 (score {best_score:.2f}, {(time.monotonic() - t0) * 1000:.0f} ms)")
+            return best_box
+        return None
+
+# 自我測試的後端 (自動選擇時取預算內實測 IoU 最高者)
+TRACKER_BACKENDS = ("CSRT", "KCF", "MIL", "MOSSE")
+
+def create_cv_tracker(name):
+    """建立 OpenCV tracker；4.5+ 部分 tracker 移到 legacy / contrib，找不到回傳 None"""
+    for module in (cv2, getattr(cv2, "legacy", None)):
+        factory = getattr(module, f"Tracker{name}_create", None) if module else None
+        if factory:
+            return factory()
+    return None
+
+class ScaledTracker:
+    """
+    OpenCV tracker 包裝：可在縮小的畫面上追蹤，回傳的 bbox 換算回原尺寸
+    """
+    def __init__(self, backend, scale=1.0):
+        self.backend = backend
+        self.scale = scale
+        self.tracker = create_cv_tracker(backend)
+        if self.tracker is None:
+            raise ValueError(f"OpenCV 沒有 {backend} tracker")
+
+    def _resize(self, frame):
+        if self.scale == 1.0: return frame
+        return cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def init(self, frame, bbox):
+        s = self.scale
+        x, y, w, h = bbox
+        self.tracker.init(self._resize(frame), (int(x * s), int(y * s), max(1, int(w * s)), max(1, int(h * s))))
+
+    def update(self, frame):
+        ok, bbox = self.tracker.update(self._resize(frame))
+        if not ok: return False, None
+        s = self.scale
+        x, y, w, h = bbox
+        return True, (int(x / s), int(y / s), int(w / s), int(h / s))
+
+def _synthetic_sequence(n=40, size=(480, 640)):
+    """自我測試用的畫面：有紋理的背景上一塊移動的目標，回傳 (frames, 真實 bbox)"""
+    rng = np.random.default_rng(0)
+    h, w = size
+    background = cv2.GaussianBlur(rng.integers(0, 255, (h, w, 3), dtype=np.uint8), (9, 9), 0)
+    target = rng.integers(0, 255, (80, 60, 3), dtype=np.uint8)
+    cv2.rectangle(target, (5, 5), (55, 75), (0, 0, 255), 3)
+    frames, boxes = [], []
+    for i in range(n):
+        x, y = 200 + i * 4, 150 + int(20 * np.sin(i / 6))
+        frame = background.copy()
+        frame[y:y+80, x:x+60] = target
+        frames.append(frame)
+        boxes.append((x, y, 60, 80))
+    return frames, boxes
+
+def _box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return float(iou_matrix([(ax, ay, ax + aw, ay + ah)], [(bx, by, bx + bw, by + bh)])[0, 0])
+
+BENCH_MIN_FRAMES = 5 # 至少量幾幀才判斷是否超出預算
+
+def benchmark_trackers(backends=TRACKER_BACKENDS, scale=config.TRACKER_SCALE, budget_ms=None):
+    """
+    每個後端跑一段合成畫面，回傳 {名稱: (平均每幀毫秒, 平均 IoU)}，沒有的後端略過
+    budget_ms: 量了幾幀後平均已超出預算就提早停止 (結果只涵蓋已量的幀)，避免開機時被慢的後端卡住
+    """
+    frames, boxes = _synthetic_sequence()
+    results = {}
+    for name in backends:
+        try:
+            tracker = ScaledTracker(name, scale)
+        except ValueError:
+            continue
+        try:
+            tracker.init(frames[0], boxes[0])
+            elapsed, ious = 0.0, []
+            for frame, truth in zip(frames[1:], boxes[1:]):
+                t0 = time.perf_counter()
+                ok, bbox = tracker.update(frame)
+                elapsed += time.perf_counter() - t0
+                ious.append(_box_iou(bbox, truth) if ok else 0.0)
+                if budget_ms is not None and len(ious) >= BENCH_MIN_FRAMES and elapsed / len(ious) * 1000 > budget_ms:
+                    break
+            results[name] = (elapsed / len(ious) * 1000, sum(ious) / len(ious))
+        except cv2.error as e:
+            print(f"⚠️ {name} tracker 測試失敗: {e}")
+    return results
+
+def select_tracker_backend(preferred=config.TRACKER_BACKEND, budget_ms=config.TRACKER_BUDGET_MS, scale=config.TRACKER_SCALE):
+    """
+    選擇追蹤器後端，回傳 (名稱, 每幀毫秒)
+    preferred 為 auto 時，挑時間預算內最準的一個 (追蹤品質太差的不算)
+    """
+    if preferred.upper() != "AUTO":
+        cost = benchmark_trackers((preferred.upper(),), scale).get(preferred.upper())
+        if cost:
+            return preferred.upper(), cost[0]
+        print(f"⚠️ 找不到 {preferred} tracker，改為自動選擇")
+
+    results = benchmark_trackers(scale=scale, budget_ms=budget_ms)
+    for name in TRACKER_BACKENDS:
+        if name in results:
+            ms, iou = results[name]
+            print(f"⏱️ {name:5s} tracker: {ms:6.2f} ms/frame, IoU {iou:.2f}")
+    # 預算內、品質及格的候選中取實測 IoU 最高的 (同分取較快者)
+    candidates = [n for n, (ms, iou) in results.items() if ms <= budget_ms and iou >= 0.5]
+    if candidates:
+        name = max(candidates, key=lambda n: (results[n][1], -results[n][0]))
+        return name, results[name][0]
+    # 都超出預算就選最快的
+    if results:
+        name = min(results, key=lambda n: results[n][0])
+        return name, results[name][0]
+    return None, 0.0
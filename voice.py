@@ -1,9 +1,9 @@
 import queue
 import json
-import threading
 import sounddevice as sd
 from vosk import Model, KaldiRecognizer
 import config
+from intent_matcher import IntentMatcher
 
 class VoiceSystem:
     def __init__(self, state, hardware, vision_system):
@@ -11,6 +11,7 @@ class VoiceSystem:
         self.hardware = hardware
         self.vision_system = vision_system # Need access to name_to_id
         self.q = queue.Queue()
+        self.intent_matcher = IntentMatcher()
 
     def audio_callback(self, indata, frames, time, status):
         if status:
@@ -29,7 +30,7 @@ class VoiceSystem:
 
         # 2. 直接開火
         if text in ["開火", "發射", "射擊", "fire"]:
-            threading.Thread(target=self.hardware.fire_gun).start()
+            self.hardware.commands.fire("voice")
             return
 
         # 3. 手動移動
@@ -64,25 +65,31 @@ class VoiceSystem:
             print("🛑 系統停止/手動模式")
             return
 
-        # 5. Coral 追蹤
-        for name, pid in self.vision_system.name_to_id.items():
-            if name in text:
-                self.state.target_config = {"id": pid, "name": name}
-                self.state.current_mode = "CORAL_TRACK"
-                print(f"🚀 Coral 追蹤: [{name}]")
-                return
+        # 5. Coral 追蹤 (中英文別名，一次掃描取最長的目標名稱)
+        match = self.vision_system.label_index.find(text)
+        if match:
+            pid, name, alias = match
+            self.state.target_config = {"id": pid, "name": name}
+            self.state.current_mode = "CORAL_TRACK"
+            print(f"🚀 Coral 追蹤: [{name}] ({alias})")
+            return
 
-        # 5. Gemini 意圖識別 (Fallback)
-        # 如果以上本地指令都沒對中，就問 Gemini
-        print("🤔 本地指令未匹配，詢問 Gemini 意圖...")
-        intent_data = self.vision_system.ask_gemini_intent(text)
+        # 6. 本地拼音模糊比對 (諧音 / 誤聽)，信心足夠就不必詢問 Gemini
+        intent = self.intent_matcher.match(text)
+        if intent:
+            intent_data = {"intent": intent}
+        else:
+            # 7. Gemini 意圖識別 (Fallback)
+            # 如果以上本地指令都沒對中，就問 Gemini
+            print("🤔 本地指令未匹配，詢問 Gemini 意圖...")
+            intent_data = self.vision_system.ask_gemini_intent(text)
         
         if intent_data:
             intent = intent_data.get("intent")
-            print(f"🧠 Gemini 意圖判斷: {intent}")
+            print(f"🧠 意圖判斷: {intent}")
             
             if intent == "FIRE":
-                threading.Thread(target=self.hardware.fire_gun).start()
+                self.hardware.commands.fire("gemini")
                 return
             elif intent == "STOP":
                 self.state.current_mode = "IDLE"
@@ -93,7 +100,7 @@ class VoiceSystem:
                 return
             elif intent == "SENTRY_MODE":
                 self.state.current_mode = "SENTRY_MODE"
-                print("🛡️ Gemini: 切換至哨兵模式")
+                print("🛡️ 切換至哨兵模式")
                 return
             elif intent == "SEARCH":
                 target = intent_data.get("target")
@@ -103,7 +110,7 @@ class VoiceSystem:
                     print(f"🧠 Gemini 搜尋目標: [{target}]")
                 return
 
-        # 6. 舊的 Gemini 搜尋 (作為最後手段，如果 Gemini Intent 也失敗或回傳 UNKNOWN)
+        # 8. 舊的 Gemini 搜尋 (作為最後手段，如果 Gemini Intent 也失敗或回傳 UNKNOWN)
         clean_prompt = text.replace("後開火", "").replace("幫我", "").replace("鎖定", "").replace("找", "").replace("看", "").replace("往", "")
         if clean_prompt and len(clean_prompt) > 1:
             self.state.gemini_prompt = clean_prompt
@@ -127,11 +134,8 @@ class VoiceSystem:
                         text = res.get('text', '').replace(' ', '')
                         if text:
                             print(f"👂: {text}")
-                            # 記錄到共享狀態，保留最近 10 筆
-                            with self.state.lock:
-                                self.state.voice_logs.append(text)
-                                if len(self.state.voice_logs) > 10:
-                                    self.state.voice_logs.pop(0)
+                            # 記錄到共享狀態 (保留最近 10 筆) 並推送給網頁
+                            self.state.add_voice_log(text)
                             self.parse_command(text)
         except Exception as e:
             print(f"❌ 語音錯誤: {e}")
@@ -1,14 +1,11 @@
-from flask import Flask, Response, render_template_string, request
-import threading
-import cv2
+import json
+from flask import Flask, Response, jsonify, render_template_string, request
 import config
+from streaming import MJPEGBroadcaster, parse_stream_args
+from control_channel import apply_command, HAS_WEBSOCKETS
 
-def create_app(state, hardware, audio):
-    app = Flask(__name__)
-
-    @app.route('/')
-    def index():
-        return render_template_string("""
+# 首頁 (Jinja 樣板，asyncio 伺服器也共用)
+INDEX_HTML = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -267,6 +264,9 @@ def create_app(state, hardware, audio):
         <div class="status-box">
             <div>STATUS: <span id="status-text" style="color: #00ff00">ACTIVE</span></div>
             <div>MODE: <span id="mode-text">MANUAL</span></div>
+            <div>LINK: <span id="link-text">HTTP</span></div>
+            <div>FPS: <span id="fps-text">-</span> / PAN: <span id="pan-text">-</span> / TILT: <span id="tilt-text">-</span></div>
+            <div>SENTRY: <span id="sentry-text">-</span></div>
         </div>
 
         <button class="btn mode-btn" onclick="toggleControlMode()">SWITCH TO SLIDERS</button>
@@ -317,14 +317,82 @@ def create_app(state, hardware, audio):
         let moveInterval = null;
         let isSliderMode = false;
 
-        // Voice Log Polling
-        setInterval(() => {
-            fetch('/voice_log').then(r => r.json()).then(data => {
-                const box = document.getElementById('tab-voice');
-                box.innerHTML = data.map(l => `> ${l}`).join('<br>');
-                box.scrollTop = box.scrollHeight;
-            }).catch(() => {});
-        }, 1000);
+        // WebSocket Control Channel (falls back to /cmd when not connected)
+        const WS_PORT = {{ ws_port }};
+        let ws = null;
+        let wsSeq = 0;
+        const wsSent = {};
+
+        function connectWs() {
+            if (!WS_PORT) return;
+            ws = new WebSocket(`ws://${location.hostname}:${WS_PORT}`);
+            ws.onopen = () => {
+                document.getElementById('link-text').innerText = 'WS';
+                log('Control link: WebSocket');
+            };
+            ws.onclose = () => {
+                ws = null;
+                document.getElementById('link-text').innerText = 'HTTP';
+                setTimeout(connectWs, 2000);
+            };
+            ws.onmessage = (e) => {
+                const ack = JSON.parse(e.data);
+                const sent = wsSent[ack.last_id];
+                ack.ids.forEach(id => delete wsSent[id]);
+                if (sent !== undefined) {
+                    document.getElementById('link-text').innerText = `WS ${(performance.now() - sent).toFixed(0)} ms`;
+                }
+                document.getElementById('mode-text').innerText = ack.mode;
+            };
+        }
+        connectWs();
+
+        function sendControl(msg, endpoint) {
+            if (ws && ws.readyState === WebSocket.OPEN) {
+                msg.id = ++wsSeq;
+                wsSent[msg.id] = performance.now();
+                ws.send(JSON.stringify(msg));
+            } else {
+                sendCmd(endpoint);
+            }
+        }
+
+        // Telemetry (Server-Sent Events, resumes from Last-Event-ID on reconnect)
+        const telemetry = new EventSource('/events');
+
+        function appendVoice(text) {
+            const box = document.getElementById('tab-voice');
+            box.innerHTML += `> ${text}<br>`;
+            box.scrollTop = box.scrollHeight;
+        }
+
+        function renderStatus(s) {
+            if (!s) return;
+            document.getElementById('fps-text').innerText = s.fps;
+            document.getElementById('pan-text').innerText = s.pan;
+            document.getElementById('tilt-text').innerText = s.tilt;
+        }
+
+        function renderSentry(timers) {
+            const entries = Object.entries(timers || {});
+            document.getElementById('sentry-text').innerText =
+                entries.length ? entries.map(([id, t]) => `#${id} ${t}s`).join('  ') : '-';
+        }
+
+        telemetry.addEventListener('snapshot', (e) => {
+            const s = JSON.parse(e.data);
+            document.getElementById('tab-voice').innerHTML = '';
+            s.voice_logs.forEach(appendVoice);
+            document.getElementById('mode-text').innerText = s.mode;
+            renderStatus(s.status);
+            renderSentry(s.sentry);
+        });
+        telemetry.addEventListener('voice', (e) => appendVoice(JSON.parse(e.data).text));
+        telemetry.addEventListener('mode', (e) => {
+            document.getElementById('mode-text').innerText = JSON.parse(e.data).mode;
+        });
+        telemetry.addEventListener('status', (e) => renderStatus(JSON.parse(e.data)));
+        telemetry.addEventListener('sentry', (e) => renderSentry(JSON.parse(e.data)));
 
         function switchTab(tab) {
             document.querySelectorAll('.tab-btn').forEach(b => b.classList.remove('active'));
@@ -364,17 +432,17 @@ def create_app(state, hardware, audio):
         function updateSlider(axis, val) {
             document.getElementById(axis + '-val').innerText = val;
             // Debounce could be added here if needed, but for local network it's usually fine
-            sendCmd(`/cmd?mode=set_angle&axis=${axis}&val=${val}`);
+            sendControl({cmd: 'set_angle', axis: axis, val: Number(val)}, `/cmd?mode=set_angle&axis=${axis}&val=${val}`);
         }
 
         function setMode(mode) {
-            sendCmd('/cmd?mode=mode&val=' + mode);
+            sendControl({cmd: 'mode', val: mode}, '/cmd?mode=mode&val=' + mode);
             document.getElementById('mode-text').innerText = mode;
             log(`Mode set to ${mode}`);
         }
 
         function fire() {
-            sendCmd('/cmd?mode=fire&val=1');
+            sendControl({cmd: 'fire'}, '/cmd?mode=fire&val=1');
             log('FIRING!');
             const btn = document.getElementById('btn-space');
             btn.classList.add('active');
@@ -382,7 +450,7 @@ def create_app(state, hardware, audio):
         }
 
         function move(dir) {
-            sendCmd('/cmd?mode=move&val=' + dir);
+            sendControl({cmd: 'move', val: dir}, '/cmd?mode=move&val=' + dir);
         }
 
         function startMove(dir) {
@@ -432,65 +500,35 @@ def create_app(state, hardware, audio):
     </script>
 </body>
 </html>
-        """)
+"""
+
+def create_app(state, hardware, audio):
+    app = Flask(__name__)
+    # 所有觀看者共用同一個編碼器
+    broadcaster = MJPEGBroadcaster(state.frames)
+
+    @app.route('/')
+    def index():
+        return render_template_string(INDEX_HTML, ws_port=config.CONTROL_WS_PORT if HAS_WEBSOCKETS else 0)
 
     @app.route('/video_feed')
     def video_feed():
-        def gen():
-            import time
-            while True:
-                frame = None
-                with state.lock:
-                    if state.output_frame is not None:
-                        frame = state.output_frame.copy()
-                
-                if frame is not None:
-                    _, enc = cv2.imencode(".jpg", frame)
-                    yield(b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + bytearray(enc) + b'\r\n')
-                
-                time.sleep(0.05) # Limit FPS to ~20 to prevent network flooding
-        return Response(gen(), mimetype="multipart/x-mixed-replace; boundary=frame")
+        # 可選參數: scale (0.1-1.0) 或 width、quality (10-100)、fps、adaptive=1
+        try:
+            scale, quality, fps, adaptive = parse_stream_args(request.args)
+        except ValueError:
+            return "Bad stream parameters", 400
+        return Response(broadcaster.stream(scale, quality, fps, adaptive), mimetype="multipart/x-mixed-replace; boundary=frame")
 
     @app.route('/cmd')
     def cmd():
+        # HTTP 控制 (相容用)；網頁優先使用 WebSocket 控制通道
         mode = request.args.get('mode')
         val = request.args.get('val')
-        
-        if mode == 'fire': 
-            threading.Thread(target=hardware.fire_gun).start()
-        
-        elif mode == 'mode':
-            state.current_mode = val
-            audio.mode_switched(val) # 播放模式切換語音
-            if val == 'CORAL_TRACK': 
-                state.target_config = {"id": 0, "name": "person"}
-        
-        elif mode == 'set_angle':
-            state.current_mode = "IDLE"
-            axis = request.args.get('axis')
-            try:
-                angle = float(val)
-                if axis == 'pan':
-                    hardware.set_angles(pan=angle, tilt=None)
-                elif axis == 'tilt':
-                    hardware.set_angles(pan=None, tilt=angle)
-            except ValueError:
-                pass
-
-        elif mode == 'move':
-            # Manual control overrides current mode to IDLE
-            state.current_mode = "IDLE"
-            step = 5 # Small step for smooth continuous movement
-            pan_d, tilt_d = 0, 0
-            
-
-            if val == 'left': pan_d = step
-            elif val == 'right': pan_d = -step
-            elif val == 'up': tilt_d = step
-            elif val == 'down': tilt_d = -step
-            
-            hardware.manual_move(pan_d, tilt_d)
-            
+        result = apply_command(state, hardware, audio, mode, val, request.args.get('axis'))
+        if mode == 'fire':
+            # 交給致動器佇列 (重複的請求會合併)，回傳結果與延遲
+            return jsonify(result.wait(1.0))
         return "OK"
 
     @app.route('/voice_log')
@@ -498,7 +536,39 @@ def create_app(state, hardware, audio):
         with state.lock:
             # Flask requires a Response object, dict, or string, not a raw list
             # jsonify is the standard way to return JSON lists
-            from flask import jsonify
             return jsonify(list(state.voice_logs))
+
+    @app.route('/stats')
+    def stats():
+        # 推論排程、追蹤器、控制器、Gemini 快取 / 酬載等子系統統計 (呼叫時才計算)
+        return jsonify(state.stats_snapshot())
+
+    @app.route('/events')
+    def events():
+        # Server-Sent Events 遙測：語音紀錄、模式、雲台角度 / FPS、哨兵計時
+        # 瀏覽器重連時會自動帶 Last-Event-ID，從該序號之後續傳
+        try:
+            last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_id', 0))
+        except ValueError:
+            last_id = 0
+
+        def generate():
+            last = last_id
+            pending, complete = state.events.since(last)
+            while state.running:
+                if not last or not complete:
+                    # 新連線或落後太多 (事件已被擠掉)：先送完整快照
+                    last, snapshot = state.telemetry_snapshot()
+                    yield f"id: {last}\nevent: snapshot\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+                else:
+                    for seq, kind, payload in pending:
+                        yield f"id: {seq}\nevent: {kind}\ndata: {payload}\n\n"
+                        last = seq
+                pending, complete = state.events.wait(last, timeout=15.0)
+                if complete and not pending:
+                    yield ": keepalive\n\n" # 閒置時每 15 秒一次，偵測斷線
+
+        return Response(generate(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
     
     return app